@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the regex cleaning engine.
+
+Compares the throughput (MB of article text per second) of the compiled
+`clean_with_regex` pipeline against the previous implementation, which ran
+each substitution through `re.sub` and stripped templates in a loop.
+
+Usage:
+    python3 benchmark_cleaning.py                       # built-in sample articles
+    python3 benchmark_cleaning.py path/to/wiki_00 ...   # articles from WikiExtractor files
+"""
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+from prepare_wikivoyage_data import clean_with_regex
+
+
+def legacy_clean_with_regex(text, skip_templates_links=False):
+    """The pre-compilation implementation, kept only as a baseline."""
+    if not text or text.strip() == "":
+        return ""
+    
+    if not skip_templates_links:
+        text = re.sub(r'\{\|.*?\|\}', '', text, flags=re.DOTALL)
+        
+        max_iterations = 10
+        for _ in range(max_iterations):
+            prev_text = text
+            text = re.sub(r'\{\{[^{}]*?\}\}', '', text)
+            if prev_text == text:
+                break
+        
+        text = re.sub(r'\{\{|\}\}', '', text)
+        
+        text = re.sub(r'\[\[File:.*?\]\]', '', text, flags=re.IGNORECASE | re.DOTALL)
+        text = re.sub(r'\[\[Image:.*?\]\]', '', text, flags=re.IGNORECASE | re.DOTALL)
+        text = re.sub(r'\[\[Category:.*?\]\]', '', text, flags=re.IGNORECASE)
+        
+        text = re.sub(r'\[\[(?:[^|\]]*\|)?([^\]]+)\]\]', r'\1', text)
+        text = re.sub(r'\[\[|\]\]', '', text)
+    
+    text = re.sub(r'\{coord\|.*?\}', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'<coordinates>.*?</coordinates>', '', text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r'\d+°\s*\d*\'?\s*[NSEW]\s+\d+°\s*\d*\'?\s*[NSEW]', '', text)
+    text = re.sub(r'\d+\.\d+°?\s*[NSEW],?\s*\d+\.\d+°?\s*[NSEW]', '', text)
+    text = re.sub(r'<!--.*?-->', '', text, flags=re.DOTALL)
+    text = re.sub(r'<[^>]+>', '', text)
+    text = re.sub(r'<ref[^>]*>.*?</ref>', '', text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r'<ref[^>]*/?\>', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'<gallery[^>]*>.*?</gallery>', '', text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r"'''|''", '', text)
+    text = re.sub(r'^[#\*:;]+\s*', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^=+\s*(.*?)\s*=+$', r'\1', text, flags=re.MULTILINE)
+    text = re.sub(r'\[https?://[^\s\]]+\s+([^\]]+)\]', r'\1', text)
+    text = re.sub(r'https?://\S+', '', text)
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'^\s+|\s+$', '', text, flags=re.MULTILINE)
+    return text.strip()
+
+
+SAMPLE_ARTICLE = """{{pagebanner|Sample banner.jpg|caption={{w|Old Town}} at dusk}}
+'''Sampleton''' is a [[city]] in [[Exampleland|the Example region]] known for its '''old town''' and ''canals''.
+{{coord|48.85|2.35}} 48.8566°N, 2.3522°E
+<!-- Editors: keep this intro short -->
+[[File:Sampleton skyline.jpg|thumb|The skyline, seen from [[Hill Park]]]]
+== Understand ==
+Sampleton grew around a river crossing.<ref>{{cite web|url=https://example.org|title=History}}</ref>
+{| class="wikitable"
+| Jan || 3°C
+|}
+== Get in ==
+* {{go|name=Central Station|url=https://example.org/station|content=Trains from the capital every {{hour|1}}.}}
+* The [http://example.org/airport Sampleton airport] is 20 km north of the centre.
+== See ==
+# {{see|name=Cathedral|address=Main Square|content=Gothic church, free entry.}}
+# {{see|name=City museum|url=https://example.org/museum}} Exhibits on local history.
+== Eat ==
+* {{eat|name=Canal Bistro|price=€15|content=Local fish dishes.}}
+<gallery>
+File:Food.jpg|Local dish
+</gallery>
+== Sleep ==
+* {{sleep|name=Old Town Hostel|price=€25}} Friendly, central.
+[[Category:Cities in Exampleland]]
+"""
+
+
+def load_articles(paths):
+    """Load article texts from WikiExtractor JSONL files, or use the built-in sample."""
+    if not paths:
+        return [SAMPLE_ARTICLE.replace('Sampleton', f'Sampleton{i}') for i in range(500)]
+    
+    articles = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    articles.append(json.loads(line).get('text', ''))
+                except json.JSONDecodeError:
+                    continue
+    return articles
+
+
+def measure(clean, articles, repeat):
+    """Return the best wall time over `repeat` runs of `clean` across all articles."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in articles:
+            clean(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clean_with_regex throughput")
+    parser.add_argument("files", nargs="*", type=Path, help="WikiExtractor JSONL files")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per implementation")
+    args = parser.parse_args()
+    
+    articles = load_articles(args.files)
+    megabytes = sum(len(text.encode('utf-8')) for text in articles) / 1e6
+    
+    same = sum(clean_with_regex(t) == legacy_clean_with_regex(t) for t in articles)
+    legacy_time = measure(legacy_clean_with_regex, articles, args.repeat)
+    compiled_time = measure(clean_with_regex, articles, args.repeat)
+    
+    print(f"Articles: {len(articles)} ({megabytes:.2f} MB)")
+    print(f"Identical output: {same}/{len(articles)}")
+    print(f"  legacy:   {megabytes / legacy_time:8.2f} MB/s")
+    print(f"  compiled: {megabytes / compiled_time:8.2f} MB/s")
+    print(f"  speedup:  {legacy_time / compiled_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
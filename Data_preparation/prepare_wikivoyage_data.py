@@ -9,8 +9,14 @@ This script:
 4. Outputs data in the format: {"id": "...", "title": "...", "section_name": "content", ...}
 """
 
+import argparse
+import gzip
+import hashlib
+import io
 import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import sys
 
@@ -22,6 +28,26 @@ except ImportError:
     HAS_MWPARSER = False
     print("Warning: mwparserfromhell not installed. Using regex-only mode.")
 
+# zstandard is only needed for --compression zstd
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+
+# Bump whenever cleaning, filtering or section extraction changes so that
+# incremental runs rebuild every output produced by an older pipeline.
+PIPELINE_VERSION = 1
+
+# Per-output-directory record of input hashes, written after every file
+MANIFEST_NAME = '.manifest.json'
+
+# Output file suffix for each supported compression (None = plain JSONL)
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+WRITE_BUFFER_SIZE = 1 << 20
+
 
 # ============================================================================
 # COMMON WIKIVOYAGE SECTIONS
@@ -51,6 +77,11 @@ COMMON_SECTIONS = [
     'Go next',
 ]
 
+# Lowercase header name -> snake_case output field, for O(1) header lookups
+SECTION_FIELDS = {
+    name.lower(): name.lower().replace(' ', '_') for name in COMMON_SECTIONS
+}
+
 
 # ============================================================================
 # TEXT CLEANING FUNCTIONS
@@ -91,66 +122,157 @@ def clean_with_mwparser(text):
         return clean_with_regex(text)
 
 
+# Patterns are compiled once at import time, and passes whose marker does
+# not occur in the article are skipped. The passes run one after another in
+# the original order: merging them into alternations changes the output
+# whenever one pass's match overlaps another's (e.g. a header line that
+# starts with a list marker, or a link nested in a file reference).
+TABLE_RE = re.compile(r'\{\|.*?\|\}', re.DOTALL)
+TEMPLATE_RE = re.compile(r'\{\{[^{}]*?\}\}')
+TEMPLATE_BRACE_RE = re.compile(r'\{\{|\}\}')
+# Rounds of innermost-template removal; deeper nesting keeps its outer braces' content
+MAX_TEMPLATE_DEPTH = 10
+FILE_LINK_RE = re.compile(r'\[\[File:.*?\]\]', re.IGNORECASE | re.DOTALL)
+IMAGE_LINK_RE = re.compile(r'\[\[Image:.*?\]\]', re.IGNORECASE | re.DOTALL)
+CATEGORY_LINK_RE = re.compile(r'\[\[Category:.*?\]\]', re.IGNORECASE)
+WIKILINK_RE = re.compile(r'\[\[(?:[^|\]]*\|)?([^\]]+)\]\]')
+LINK_BRACKET_RE = re.compile(r'\[\[|\]\]')
+COORD_TEMPLATE_RE = re.compile(r'\{coord\|.*?\}', re.IGNORECASE)
+COORDINATES_TAG_RE = re.compile(r'<coordinates>.*?</coordinates>', re.IGNORECASE | re.DOTALL)
+DMS_POSITION_RE = re.compile(r'\d+°\s*\d*\'?\s*[NSEW]\s+\d+°\s*\d*\'?\s*[NSEW]')
+DECIMAL_POSITION_RE = re.compile(r'\d+\.\d+°?\s*[NSEW],?\s*\d+\.\d+°?\s*[NSEW]')
+HTML_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+REF_RE = re.compile(r'<ref[^>]*>.*?</ref>', re.IGNORECASE | re.DOTALL)
+REF_MARKER_RE = re.compile(r'<ref[^>]*/?\>', re.IGNORECASE)
+GALLERY_RE = re.compile(r'<gallery[^>]*>.*?</gallery>', re.IGNORECASE | re.DOTALL)
+BOLD_ITALIC_RE = re.compile(r"'''|''")
+LIST_MARKER_RE = re.compile(r'^[#\*:;]+\s*', re.MULTILINE)
+HEADER_RE = re.compile(r'^=+\s*(.*?)\s*=+$', re.MULTILINE)
+LABELLED_URL_RE = re.compile(r'\[https?://[^\s\]]+\s+([^\]]+)\]')
+BARE_URL_RE = re.compile(r'https?://\S+')
+BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+SPACE_RUN_RE = re.compile(r'[ \t]{2,}|\t')
+LINE_EDGE_WS_RE = re.compile(r'^\s+|\s+$', re.MULTILINE)
+
+
+def strip_templates_iteratively(text):
+    """Drop innermost brace-free templates for up to MAX_TEMPLATE_DEPTH rounds, then stray markers."""
+    for _ in range(MAX_TEMPLATE_DEPTH):
+        text, count = TEMPLATE_RE.subn('', text)
+        if not count:
+            break
+    return TEMPLATE_BRACE_RE.sub('', text)
+
+
+def strip_templates(text):
+    """
+    Remove nested {{...}} templates in a single linear scan.
+    
+    Balanced templates are dropped together with their content; unmatched
+    '{{' or '}}' markers are dropped on their own. This equals the iterative
+    removal as long as every brace belongs to a '{{' or '}}' marker and
+    nesting stays within MAX_TEMPLATE_DEPTH; other text (e.g. '{{a {b}}}')
+    takes the iterative path.
+    """
+    if '{{' not in text and '}}' not in text:
+        return text
+    
+    spans = []
+    open_starts = []
+    markers = 0
+    
+    for match in TEMPLATE_BRACE_RE.finditer(text):
+        markers += 1
+        if match.group() == '{{':
+            open_starts.append(match.start())
+            if len(open_starts) > MAX_TEMPLATE_DEPTH:
+                return strip_templates_iteratively(text)
+        elif open_starts:
+            start = open_starts.pop()
+            # Templates nested inside this one are covered by its span
+            while spans and spans[-1][0] >= start:
+                spans.pop()
+            spans.append((start, match.end()))
+        else:
+            spans.append((match.start(), match.end()))
+    
+    if text.count('{') + text.count('}') != 2 * markers:
+        return strip_templates_iteratively(text)
+    
+    if open_starts:
+        spans.extend((start, start + 2) for start in open_starts)
+        spans.sort()
+    
+    pieces = []
+    position = 0
+    for start, end in spans:
+        pieces.append(text[position:start])
+        position = end
+    pieces.append(text[position:])
+    
+    return ''.join(pieces)
+
+
 def clean_with_regex(text, skip_templates_links=False):
     """Clean wiki markup using regex patterns."""
     if not text or text.strip() == "":
         return ""
     
     if not skip_templates_links:
-        # Remove tables
-        text = re.sub(r'\{\|.*?\|\}', '', text, flags=re.DOTALL)
-        
-        # Remove templates {{...}}
-        max_iterations = 10
-        for _ in range(max_iterations):
-            prev_text = text
-            text = re.sub(r'\{\{[^{}]*?\}\}', '', text)
-            if prev_text == text:
-                break
+        # Remove tables and templates {{...}}
+        if '{|' in text:
+            text = TABLE_RE.sub('', text)
+        text = strip_templates(text)
         
-        text = re.sub(r'\{\{|\}\}', '', text)
-        
-        # Remove file/image references
-        text = re.sub(r'\[\[File:.*?\]\]', '', text, flags=re.IGNORECASE | re.DOTALL)
-        text = re.sub(r'\[\[Image:.*?\]\]', '', text, flags=re.IGNORECASE | re.DOTALL)
-        text = re.sub(r'\[\[Category:.*?\]\]', '', text, flags=re.IGNORECASE)
-        
-        # Convert wiki links [[link|text]] to just text
-        text = re.sub(r'\[\[(?:[^|\]]*\|)?([^\]]+)\]\]', r'\1', text)
-        text = re.sub(r'\[\[|\]\]', '', text)
+        if '[[' in text:
+            # Remove file/image/category references
+            text = FILE_LINK_RE.sub('', text)
+            text = IMAGE_LINK_RE.sub('', text)
+            text = CATEGORY_LINK_RE.sub('', text)
+            
+            # Convert wiki links [[link|text]] to just text
+            text = WIKILINK_RE.sub(r'\1', text)
+        if '[[' in text or ']]' in text:
+            text = LINK_BRACKET_RE.sub('', text)
     
     # Remove coordinates and geo data
-    text = re.sub(r'\{coord\|.*?\}', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'<coordinates>.*?</coordinates>', '', text, flags=re.IGNORECASE | re.DOTALL)
-    text = re.sub(r'\d+°\s*\d*\'?\s*[NSEW]\s+\d+°\s*\d*\'?\s*[NSEW]', '', text)
-    text = re.sub(r'\d+\.\d+°?\s*[NSEW],?\s*\d+\.\d+°?\s*[NSEW]', '', text)
-    
-    # Remove HTML comments
-    text = re.sub(r'<!--.*?-->', '', text, flags=re.DOTALL)
-    
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
-    
-    # Remove reference tags
-    text = re.sub(r'<ref[^>]*>.*?</ref>', '', text, flags=re.IGNORECASE | re.DOTALL)
-    text = re.sub(r'<ref[^>]*/?\>', '', text, flags=re.IGNORECASE)
-    
-    # Remove gallery tags
-    text = re.sub(r'<gallery[^>]*>.*?</gallery>', '', text, flags=re.IGNORECASE | re.DOTALL)
-    
-    # Remove common wiki artifacts
-    text = re.sub(r"'''|''", '', text)  # Bold/italic markup
-    text = re.sub(r'^[#\*:;]+\s*', '', text, flags=re.MULTILINE)  # List markers
-    text = re.sub(r'^=+\s*(.*?)\s*=+$', r'\1', text, flags=re.MULTILINE)  # Headers
+    if '{' in text:
+        text = COORD_TEMPLATE_RE.sub('', text)
+    if '<' in text:
+        text = COORDINATES_TAG_RE.sub('', text)
+    if '°' in text:
+        text = DMS_POSITION_RE.sub('', text)
+    text = DECIMAL_POSITION_RE.sub('', text)
+    
+    if '<' in text:
+        # Remove HTML comments and tags
+        text = HTML_COMMENT_RE.sub('', text)
+        text = HTML_TAG_RE.sub('', text)
+    
+    if '<' in text:
+        # Reference and gallery markers can only survive the tag pass when
+        # removing a tag joined their pieces, e.g. '<<b>ref>'
+        text = REF_RE.sub('', text)
+        text = REF_MARKER_RE.sub('', text)
+        text = GALLERY_RE.sub('', text)
+    
+    # Remove common wiki artifacts: bold/italic, list markers, then headers
+    if "''" in text:
+        text = BOLD_ITALIC_RE.sub('', text)
+    text = LIST_MARKER_RE.sub('', text)
+    if '=' in text:
+        text = HEADER_RE.sub(r'\1', text)
     
     # Remove external URLs
-    text = re.sub(r'\[https?://[^\s\]]+\s+([^\]]+)\]', r'\1', text)
-    text = re.sub(r'https?://\S+', '', text)
+    if '://' in text:
+        text = LABELLED_URL_RE.sub(r'\1', text)
+        text = BARE_URL_RE.sub('', text)
     
     # Clean up whitespace
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-    text = re.sub(r'[ \t]+', ' ', text)
-    text = re.sub(r'^\s+|\s+$', '', text, flags=re.MULTILINE)
+    text = BLANK_LINES_RE.sub('\n\n', text)
+    text = SPACE_RUN_RE.sub(' ', text)
+    text = LINE_EDGE_WS_RE.sub('', text)
     text = text.strip()
     
     return text
@@ -218,10 +340,36 @@ def is_valid_travel_article(article):
 # SECTION EXTRACTION
 # ============================================================================
 
+def section_field(line):
+    """Return the output field name if the line is a bare section header, else None."""
+    return SECTION_FIELDS.get(line.strip().rstrip('.').lower())
+
+
+def opens_section(line):
+    """
+    Check whether a header line starts a new section.
+    
+    Only a header name at the very start of the line, followed by at most one
+    '.' and trailing whitespace, opens a section. Other header-like lines
+    (indented, or ending in '..') are stray headers.
+    """
+    return not line[0].isspace() and not line.rstrip().endswith('..')
+
+
+def join_section_lines(lines):
+    """Join content lines and collapse runs of blank lines."""
+    content = '\n'.join(lines).strip()
+    return BLANK_LINES_RE.sub('\n\n', content)
+
+
 def extract_sections_robust(text):
     """
     Extract sections from cleaned WikiVoyage text.
     
+    Lines are tokenized in a single pass: a header line that opens a section
+    starts a new chunk, stray header lines are dropped, and every other line
+    is appended to the current chunk. Text before the first header is the intro.
+    
     Returns dict with section names as keys and content as values.
     """
     if not text or len(text.strip()) < 50:
@@ -229,51 +377,35 @@ def extract_sections_robust(text):
     
     sections = {}
     
-    # Create pattern that matches any of the common sections
-    section_names = '|'.join(re.escape(s) for s in COMMON_SECTIONS)
-    pattern = rf'(?=^(?:{section_names})\.?\s*$)'
-    
-    # Split text into chunks
-    chunks = re.split(pattern, text, flags=re.IGNORECASE | re.MULTILINE)
-    
-    # Process chunks
-    intro_parts = []
+    # Each chunk is [field, line, line, ...]; the first chunk is the intro
+    chunks = [[None]]
+    intro_is_blank = True
     
-    for chunk in chunks:
-        if not chunk.strip():
-            continue
-        
-        # Check if chunk starts with a section header
-        lines = chunk.strip().split('\n', 1)
-        first_line = lines[0].strip().rstrip('.')
+    for line in text.split('\n'):
+        field = section_field(line)
         
-        # Check if this is a known section header
-        section_found = None
-        for section_name in COMMON_SECTIONS:
-            if first_line.lower() == section_name.lower():
-                section_found = section_name
-                break
-        
-        if section_found:
-            # Get content after the header
-            content = lines[1] if len(lines) > 1 else ''
-            content = content.strip()
-            content = clean_section_content(content)
-            
-            if content:
-                # Convert to snake_case field name
-                field_name = section_found.lower().replace(' ', '_')
-                sections[field_name] = content
-        else:
-            # This is intro content
-            intro_parts.append(chunk.strip())
+        if field is None:
+            chunks[-1].append(line)
+            if intro_is_blank and len(chunks) == 1 and line.strip():
+                intro_is_blank = False
+        elif opens_section(line):
+            chunks.append([field])
+        elif len(chunks) == 1 and intro_is_blank:
+            # A stray header leading the text still names the first chunk
+            chunks[0] = [field]
+            intro_is_blank = False
+    
+    intro = ''
+    for chunk in chunks:
+        content = join_section_lines(chunk[1:])
+        if chunk[0] is None:
+            intro = content
+        elif content:
+            sections[chunk[0]] = content
     
-    # Combine intro parts
-    if intro_parts:
-        intro = '\n\n'.join(intro_parts).strip()
-        intro = clean_section_content(intro)
-        if intro:
-            sections['intro'] = intro
+    # Intro always comes after the named sections
+    if intro:
+        sections['intro'] = intro
     
     return sections
 
@@ -283,39 +415,52 @@ def clean_section_content(content):
     if not content:
         return ''
     
-    lines = content.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        stripped = line.strip().rstrip('.')
-        
-        # Check if this line is just a section header
-        is_header = False
-        for section_name in COMMON_SECTIONS:
-            if stripped.lower() == section_name.lower():
-                is_header = True
-                break
-        
-        if not is_header:
-            cleaned_lines.append(line)
-    
-    result = '\n'.join(cleaned_lines).strip()
-    result = re.sub(r'\n\s*\n\s*\n+', '\n\n', result)
+    lines = [line for line in content.split('\n') if section_field(line) is None]
     
-    return result
+    return join_section_lines(lines)
 
 
 # ============================================================================
 # FILE PROCESSING
 # ============================================================================
 
-def process_json_file(input_path, output_path):
-    """Process a single JSON file: clean, filter, and split sections."""
-    
-    processed_articles = []
-    total_count = 0
-    filtered_count = 0
+def temporary_path(path):
+    """Hidden sibling path used to write a file before atomically replacing it."""
+    return path.with_name(f'.{path.name}.tmp')
+
+
+def compressed_path(path, compression=None):
+    """Output path with the suffix of the chosen compression appended."""
+    suffix = COMPRESSION_SUFFIXES[compression]
+    return path.with_name(path.name + suffix) if suffix else path
+
+
+def remove_outputs(output_path, keep=None):
+    """Delete every compression variant of an output file except `keep`."""
+    for compression in COMPRESSION_SUFFIXES:
+        candidate = compressed_path(output_path, compression)
+        if candidate != keep and candidate.exists():
+            candidate.unlink()
+
+
+def open_output_file(path, compression=None):
+    """Open a buffered UTF-8 text writer, optionally gzip or zstd compressed."""
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8')
+    if compression == 'zstd':
+        writer = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+        return io.TextIOWrapper(writer, encoding='utf-8')
+    return open(path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+
+
+def iter_processed_articles(input_path, counts):
+    """
+    Lazily clean, filter and split the articles of one JSON file.
     
+    Yields one final article dict at a time, so memory stays bounded by a
+    single article regardless of file size. The 'total' and 'filtered'
+    entries of `counts` are updated as the file is consumed.
+    """
     with open(input_path, 'r', encoding='utf-8') as f:
         for line_num, line in enumerate(f, 1):
             line = line.strip()
@@ -324,7 +469,7 @@ def process_json_file(input_path, output_path):
             
             try:
                 article = json.loads(line)
-                total_count += 1
+                counts['total'] += 1
                 
                 # Clean the text
                 original_text = article.get('text', '')
@@ -335,7 +480,7 @@ def process_json_file(input_path, output_path):
                 
                 # Filter out junk articles
                 if not is_valid_travel_article(article):
-                    filtered_count += 1
+                    counts['filtered'] += 1
                     continue
                 
                 # Extract sections
@@ -349,30 +494,165 @@ def process_json_file(input_path, output_path):
                 
                 # Add all sections as top-level fields
                 final_article.update(sections)
-                
-                processed_articles.append(final_article)
-                
+            
             except json.JSONDecodeError as e:
                 print(f"  Error parsing JSON at line {line_num} in {input_path.name}: {e}")
-                filtered_count += 1
+                counts['filtered'] += 1
                 continue
             except Exception as e:
                 print(f"  Error processing line {line_num} in {input_path.name}: {e}")
-                filtered_count += 1
+                counts['filtered'] += 1
                 continue
+            
+            yield final_article
+
+
+def process_json_file(input_path, output_path, compression=None):
+    """
+    Process a single JSON file: clean, filter, and split sections.
+    
+    Articles are streamed to a buffered (optionally compressed) writer as
+    soon as they are produced. The output is written to a temporary file and
+    renamed, so a crash never leaves a partial file behind.
+    """
+    
+    counts = {'total': 0, 'filtered': 0}
+    kept_count = 0
     
-    # Write processed articles
-    if processed_articles:
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for article in processed_articles:
-                f.write(json.dumps(article, ensure_ascii=False) + '\n')
+    final_path = compressed_path(output_path, compression)
+    tmp_path = temporary_path(final_path)
+    f = None
     
-    return len(processed_articles), filtered_count, total_count
+    try:
+        for article in iter_processed_articles(input_path, counts):
+            if f is None:
+                # Only create an output once there is something to write
+                final_path.parent.mkdir(parents=True, exist_ok=True)
+                f = open_output_file(tmp_path, compression)
+            f.write(json.dumps(article, ensure_ascii=False) + '\n')
+            kept_count += 1
+    except BaseException:
+        if f is not None:
+            f.close()
+            tmp_path.unlink()
+        raise
+    
+    if f is not None:
+        f.close()
+        os.replace(tmp_path, final_path)
+    
+    # Drop outputs of previous runs that used another compression or kept articles
+    remove_outputs(output_path, keep=final_path if kept_count else None)
+    
+    return kept_count, counts['filtered'], counts['total']
+
+
+def _process_file_task(task):
+    """Worker entry point: process one (input, output, compression) task, never raise."""
+    wiki_file, output_file, compression = task
+    try:
+        return process_json_file(wiki_file, output_file, compression), None
+    except Exception as e:
+        return None, str(e)
 
 
-def process_directory(input_dir, output_dir):
-    """Process all wiki files in the directory structure."""
+# ============================================================================
+# MANIFEST
+# ============================================================================
+
+def file_sha256(path):
+    """Hash a file's contents in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_path, compression=None):
+    """
+    Load the manifest of a previous run.
+    
+    A missing or unreadable manifest yields an empty manifest. One written
+    by another pipeline version, parser or compression keeps its file list
+    with every entry marked stale: all files are reprocessed, and outputs
+    of inputs deleted since can still be cleaned up.
+    """
+    manifest_file = output_path / MANIFEST_NAME
+    parser = 'mwparserfromhell' if HAS_MWPARSER else 'regex-only'
+    current = {
+        'pipeline_version': PIPELINE_VERSION,
+        'parser': parser,
+        'compression': compression,
+        'files': {},
+    }
+    
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return current
+    
+    if any(manifest.get(key) != current[key] for key in ('pipeline_version', 'parser', 'compression')):
+        current['files'] = {
+            relative: {**entry, 'stale': True}
+            for relative, entry in manifest.get('files', {}).items()
+        }
+        return current
+    return manifest
+
+
+def save_manifest(output_path, manifest):
+    """Atomically write the manifest so a crash never leaves it half-written."""
+    output_path.mkdir(parents=True, exist_ok=True)
+    manifest_file = output_path / MANIFEST_NAME
+    tmp_path = temporary_path(manifest_file)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_file)
+
+
+def is_up_to_date(entry, file_hash, output_file):
+    """Check whether a manifest entry still describes the current input and output."""
+    if entry is None or entry.get('stale') or entry.get('sha256') != file_hash:
+        return False
+    # A file that kept articles must still have its output on disk
+    return entry.get('kept', 0) == 0 or output_file.exists()
+
+
+def remove_deleted_outputs(manifest, output_path, current_files):
+    """Delete outputs (and manifest entries) for input files that no longer exist."""
+    removed = 0
+    for relative in sorted(set(manifest['files']) - current_files):
+        remove_outputs(output_path / relative)
+        del manifest['files'][relative]
+        removed += 1
+    return removed
+
+
+# ============================================================================
+# DIRECTORY PROCESSING
+# ============================================================================
+
+def process_directory(input_dir, output_dir, workers=1, incremental=False, compression=None):
+    """
+    Process all wiki files in the directory structure.
+    
+    With workers > 1 the files are sharded across a process pool. Every input
+    file still maps to exactly one output file and results are merged in
+    sorted file order, so the output is identical to a single-process run.
+    
+    With incremental=True a manifest in the output directory records each
+    input file's SHA-256 and the pipeline version, and is saved after every
+    finished file. Only new or changed files are processed and outputs of
+    deleted inputs are removed, which also resumes an interrupted run.
+    Without it every file is processed and nothing is hashed.
+    
+    compression may be None, 'gzip' or 'zstd' to write compressed JSONL.
+    """
+    
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
     
     input_path = Path(input_dir)
     output_path = Path(output_dir)
@@ -381,6 +661,7 @@ def process_directory(input_dir, output_dir):
     total_filtered = 0
     total_processed = 0
     file_count = 0
+    skipped_count = 0
     
     # Find all wiki files
     wiki_files = sorted(list(input_path.rglob('wiki_*')))
@@ -389,34 +670,88 @@ def process_directory(input_dir, output_dir):
         print(f"❌ No wiki files found in {input_dir}")
         return
     
+    manifest = load_manifest(output_path, compression) if incremental else None
+    relative_paths = [wiki_file.relative_to(input_path).as_posix() for wiki_file in wiki_files]
+    
+    # Create corresponding output paths and skip unchanged files
+    tasks = []
+    file_hashes = {}
+    for wiki_file, relative in zip(wiki_files, relative_paths):
+        output_file = output_path / relative
+        if incremental:
+            file_hashes[relative] = file_sha256(wiki_file)
+            entry = manifest['files'].get(relative)
+            if is_up_to_date(entry, file_hashes[relative], compressed_path(output_file, compression)):
+                total_kept += entry['kept']
+                total_filtered += entry['filtered']
+                total_processed += entry['processed']
+                skipped_count += 1
+                continue
+        
+        tasks.append((wiki_file, output_file, compression))
+    
+    removed_count = 0
+    if incremental:
+        removed_count = remove_deleted_outputs(manifest, output_path, set(relative_paths))
+        save_manifest(output_path, manifest)
+    
+    workers = max(1, min(workers, len(tasks)))
+    
     print(f"Found {len(wiki_files)} files to process")
+    if incremental:
+        print(f"Incremental mode: {skipped_count} unchanged, {len(tasks)} new or changed, "
+              f"{removed_count} deleted")
     print(f"Using {'mwparserfromhell' if HAS_MWPARSER else 'regex-only'} parser")
+    print(f"Using {workers} worker process{'es' if workers > 1 else ''}")
+    print(f"Output compression: {compression or 'none'}")
     print()
     
-    for wiki_file in wiki_files:
-        # Create corresponding output path
-        relative_path = wiki_file.relative_to(input_path)
-        output_file = output_path / relative_path
-        
-        print(f"Processing {relative_path}...", end=' ')
-        
-        try:
-            kept, filtered, processed = process_json_file(wiki_file, output_file)
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # Small chunks keep the pool balanced when shard sizes differ
+        chunksize = max(1, len(tasks) // (workers * 8))
+        results = executor.map(_process_file_task, tasks, chunksize=chunksize)
+    else:
+        results = map(_process_file_task, tasks)
+    
+    try:
+        for (wiki_file, _, _), (counts, error) in zip(tasks, results):
+            relative = wiki_file.relative_to(input_path).as_posix()
+            
+            if error is not None:
+                if incremental:
+                    manifest['files'].pop(relative, None)
+                print(f"Processing {relative}... ✗ Error: {error}")
+                continue
+            
+            kept, filtered, processed = counts
             total_kept += kept
             total_filtered += filtered
             total_processed += processed
             file_count += 1
             
-            print(f"✓ (kept {kept}/{processed}, filtered {filtered})")
+            # Record the finished file right away so an interrupted run can resume
+            if incremental:
+                manifest['files'][relative] = {
+                    'sha256': file_hashes[relative],
+                    'kept': kept,
+                    'filtered': filtered,
+                    'processed': processed,
+                }
+                save_manifest(output_path, manifest)
             
-        except Exception as e:
-            print(f"✗ Error: {e}")
-            continue
+            print(f"Processing {relative}... ✓ (kept {kept}/{processed}, filtered {filtered})")
+    finally:
+        if executor is not None:
+            executor.shutdown()
     
     print()
     print("=" * 70)
     print(f"✅ Complete!")
     print(f"  Processed {file_count} files")
+    if incremental:
+        print(f"  Skipped {skipped_count} unchanged files, removed {removed_count} deleted")
     print(f"  Total articles processed: {total_processed}")
     print(f"  Articles kept: {total_kept} ({total_kept/total_processed*100:.1f}%)")
     print(f"  Articles filtered: {total_filtered} ({total_filtered/total_processed*100:.1f}%)")
@@ -428,16 +763,55 @@ def process_directory(input_dir, output_dir):
 # MAIN
 # ============================================================================
 
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="WikiVoyage data preparation pipeline")
+    parser.add_argument(
+        "input_dir",
+        nargs="?",
+        default="enwikivoyage-latest-pages-articles",
+        help="Directory with WikiExtractor JSONL output"
+    )
+    parser.add_argument(
+        "output_dir",
+        nargs="?",
+        default="enwikivoyage-sectioned",
+        help="Directory for the sectioned JSONL output"
+    )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process new or changed files (also resumes an interrupted run)"
+    )
+    parser.add_argument(
+        "--compression",
+        choices=["gzip", "zstd"],
+        default=None,
+        help="Write compressed JSONL output (.gz or .zst)"
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    # Default paths
-    input_dir = "enwikivoyage-latest-pages-articles"
-    output_dir = "enwikivoyage-sectioned"
+    args = parse_args()
+    input_dir = args.input_dir
+    output_dir = args.output_dir
     
-    # Allow command-line arguments
-    if len(sys.argv) > 1:
-        input_dir = sys.argv[1]
-    if len(sys.argv) > 2:
-        output_dir = sys.argv[2]
+    if args.compression == "zstd" and not HAS_ZSTD:
+        print("❌ Error: --compression zstd requires the zstandard package")
+        sys.exit(1)
     
     print("WikiVoyage Complete Data Preparation Pipeline")
     print("=" * 70)
@@ -450,4 +824,10 @@ if __name__ == "__main__":
         print(f"❌ Error: Input directory '{input_dir}' does not exist")
         sys.exit(1)
     
-    process_directory(input_dir, output_dir)
+    process_directory(
+        input_dir,
+        output_dir,
+        workers=args.workers,
+        incremental=args.incremental,
+        compression=args.compression
+    )
@@ -9,18 +9,37 @@ from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage,Too
 from uuid import uuid4
 # from langgraph.graph.message import add_messages
 from Model import llm_node
-from Faiss_indexing import faiss_index
+from Faiss_indexing import destination_index, faiss_index, index_version, sparse_index
+from Retrieval import DESTINATION_FILTER, HYBRID_SEARCH, SECTION_FILTER, RetrievalEngine
+from Section_filter import SectionIndex
+from Intent_classifier import IntentClassifier
+from Reranker import RerankerService
+from Query_cache import QUERY_CACHE_SIZE, QueryCache
 from tools import *
 
 from langgraph.checkpoint.memory import MemorySaver
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import CrossEncoderReranker
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-model = HuggingFaceCrossEncoder(model_name="BAAI/bge-reranker-base")
-compressor = CrossEncoderReranker(model=model, top_n=3)
+# start retrieval while the question is still being classified
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "1") == "1"
+SPECULATIVE_WORKERS = int(os.getenv("SPECULATIVE_WORKERS", "4"))
+# tool calls of one LLM turn run concurrently, at most TOOL_WORKERS at a time
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "4"))
+# seconds a tool call may run, counted from when it starts, before the model is told it
+# timed out; SERPAPI_TIMEOUT and MCP_CALL_TIMEOUT stay below it so late calls also end
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+TOOL_TIMEOUTS = {
+    "get_current_date": 5,
+    "get_location_by_ip": 10,
+}
+# loaded on first use; concurrent requests share its forward passes
+reranker = RerankerService()
+# retrieval results of repeated and paraphrased questions, shared by all agents
+query_cache = QueryCache() if QUERY_CACHE_SIZE > 0 else None
 
 import json
 
@@ -54,11 +73,30 @@ class AgentState(TypedDict):
     content:  Dict[str, str]
     question_type: str
     system_prompt: str
+    request_id: str
+    metrics: Dict[str, float]  # per-request latencies in ms
 class Agent():
     def __init__(self, system=""):
         self.system = system
         self.tools = TOOLS
         self.vectorstore = faiss_index()
+        self.retrieval = RetrievalEngine(
+            self.vectorstore,
+            cross_encoder=reranker,
+            sparse_index=sparse_index() if HYBRID_SEARCH else None,
+            destination_index=destination_index() if DESTINATION_FILTER else None,
+            section_index=SectionIndex(self.vectorstore.docstore) if SECTION_FILTER else None,
+            cache=query_cache,
+            index_version=index_version
+        )
+        self.classifier = IntentClassifier(
+            self.vectorstore.embedding_function,
+            destination_index=self.retrieval.destination_index
+        )
+        # request_id -> (future of the speculative retrieval, submit time)
+        self.speculative = {}
+        self.speculative_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS) if SPECULATIVE_RETRIEVAL else None
         graph = StateGraph(AgentState)
         graph.add_node("classify", self.classify_node)
         graph.add_node("llm",llm_node)
@@ -88,106 +126,169 @@ class Agent():
         """Classify whether the question is trip-related or not."""
         query = state["messages"][-1].content
 
-        # System prompt for classification
-        classifier_prompt = """You are a travel question classifier. Classify the user's question into one of two categories:
-
-1. "trip" - If the question is about travel planning, trips, destinations, accommodations, flights, activities, or any travel-related topic
-2. "non_trip" - If the question is a greeting, general knowledge question, or anything not related to travel
-
-Respond with ONLY the category name, nothing else."""
+        start = time.perf_counter()
+        request_id = state.get("request_id")
+        vector = None
+        # greetings and thanks are settled by the keyword rules: never search for them
+        keyword = self.classifier.keyword(query)
+        if self.executor is not None and request_id and keyword != "non_trip":
+            if keyword is None:
+                # the embedding tier will decide: embed once for it and the search
+                vector = self.retrieval.embed(query)
+            # most questions are trip questions: retrieve while classifying and
+            # drop the result if the question turns out not to need it
+            with self.speculative_lock:
+                self.speculative[request_id] = (self.executor.submit(self.retrieval.search, query, vector=vector),
+                                                time.perf_counter())
 
-        messages = [
-            SystemMessage(content=classifier_prompt),
-            HumanMessage(content=query)
-        ]
+        # keyword rules and the embedding model answer locally; the LLM only
+        # sees questions they are unsure about
+        result = self.classifier.classify(query, vector=vector)
+        question_type = result["question_type"]
+        classify_ms = (time.perf_counter() - start) * 1000
 
-        # Use a lightweight LLM for classification
-        from Model import llm
-        response = llm.invoke(messages)
-        raw = response.content.strip().lower()
-
-        # Validate — guard against empty string (tool-call response) or verbose output
-        if raw.startswith("trip"):
-            question_type = "trip"
-        else:
-            question_type = "non_trip"  # default: treat anything unclear as travel-related
-
-        print(f"[CLASSIFIER] Query: {query} → Type: {question_type}")
+        print(f"[CLASSIFIER] Query: {query} → Type: {question_type} "
+              f"({result['tier']}, confidence {result['confidence']:.2f}, {classify_ms:.1f} ms)")
 
+        metrics = {**(state.get("metrics") or {}), "classify_ms": classify_ms}
+        if question_type != "trip":
+            future = self.discard_speculative(request_id)
+            if future is not None:
+                metrics["speculative_discarded"] = 1.0
         return {
             "question_type": question_type,
-            "messages": state["messages"]
+            "messages": state["messages"],
+            "metrics": metrics
         }
+
+    def discard_speculative(self, request_id):
+        with self.speculative_lock:
+            entry = self.speculative.pop(request_id, None)
+        if entry is None:
+            return None
+        # a search that already started runs to completion (and still fills the query cache)
+        entry[0].cancel()
+        return entry[0]
     
     def route_by_question_type(self, state: AgentState):
         return state["question_type"]
   
     def Rag_node(self,state: AgentState):
         query = state["messages"][-1].content
-       
-        retriever = self.vectorstore.as_retriever(search_kwargs={"k": 4})
-        compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor, base_retriever=retriever
-    )
+        metrics = dict(state.get("metrics") or {})
 
-        docs = compression_retriever.invoke(query)
-
-        context = "\n".join(d.page_content for d in docs)
-        
-        # Extract citations from retrieved documents
-        citations = []
-        contents = []
-        for doc in docs:
-            metadata = doc.metadata
-            print(f"Metadata for retrieved doc: {metadata}")  # Debug print
-            citation = {
-                "source": metadata.get("source", "Unknown"),
-                "seq_num": metadata.get("seq_num", "Unknown")
-            }
-            content = {"context": doc.page_content}
-            if content not in contents:
-                contents.append(content)  # avoid duplicates
-            if citation not in citations:  # avoid duplicates
-                citations.append(citation)
-        citation_str = json.dumps(citations)
-        content_str = json.dumps(contents)
+        with self.speculative_lock:
+            entry = self.speculative.pop(state.get("request_id"), None)
+        start = time.perf_counter()
+        if entry is not None:
+            future, submitted = entry
+            result = future.result()
+            waited_ms = (time.perf_counter() - start) * 1000
+            # a serial search would have started now and taken the whole retrieval time
+            metrics["speculative_saved_ms"] = max(0.0, result["timings"]["total_ms"] - waited_ms)
+            metrics["retrieval_wait_ms"] = waited_ms
+        else:
+            result = self.retrieval.search(query)
+            metrics["retrieval_wait_ms"] = (time.perf_counter() - start) * 1000
+        metrics["retrieval_ms"] = result["timings"]["total_ms"]
+        timings = result["timings"]
+        stages = ", ".join(f"{name[:-3]} {ms:.1f}" for name, ms in timings.items() if name != "total_ms")
+        scope = ", ".join(result["destinations"]) or "all destinations"
+        if result["sections"]:
+            scope += f" [{', '.join(result['sections'])}]"
+        cached = ""
+        if query_cache is not None:
+            cached = f"; {result['cached'] or 'cache miss'}, hit rate {query_cache.stats()['hit_rate']:.0%}"
+        saved = f", {metrics['speculative_saved_ms']:.1f} ms saved by speculation" if entry is not None else ""
+        print(f"[RAG] {len(result['documents'])} docs from {scope} in {timings['total_ms']:.1f} ms "
+              f"({stages}{cached}{saved})")
 
         messages = []
-        messages.append(SystemMessage(content=f"Context:\n{context}"))
+        messages.append(SystemMessage(content=f"Context:\n{result['context']}"))
         messages.append(HumanMessage(content=query))
-        return {"messages": messages, "citation": citation_str, "content": content_str}
+        return {"messages": messages, "citation": result["citation"], "content": result["content"],
+                "metrics": metrics}
     def exists_action(self, state: AgentState):
         result = state['messages'][-1]
         return hasattr(result, "tool_calls") and len(result.tool_calls) > 0
 
+    def call_tool(self, t, started=None):
+        if started is not None:
+            started.set_result(time.perf_counter())  # the call's deadline counts from here
+        if t['name'] not in self.tools:      # check for bad tool name from LLM
+            print("\n ....bad tool name....")
+            return "bad tool name, retry"  # instruct LLM to retry if bad
+        start = time.perf_counter()
+        try:
+            return self.tools[t['name']].invoke(t['args'])
+        except Exception as e:
+            # one failing tool shouldn't lose the results of the others
+            return {"success": False, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            print(f"[TOOL] {t['name']} took {(time.perf_counter() - start) * 1000:.1f} ms")
+
     def take_action(self, state: AgentState):
         tool_calls = state['messages'][-1].tool_calls
-        results = []
+        start = time.perf_counter()
+        # a pool per turn: a call that hangs past its timeout keeps its thread until its own
+        # I/O timeout ends it, but never holds up the tool calls of other requests
+        executor = ThreadPoolExecutor(max_workers=max(1, min(len(tool_calls), TOOL_WORKERS)),
+                                      thread_name_prefix="tool")
+        calls = []
         for t in tool_calls:
             print(f"Calling: {t}")
-            if t['name'] not in self.tools:      # check for bad tool name from LLM
-                print("\n ....bad tool name....")
-                result = "bad tool name, retry"  # instruct LLM to retry if bad
+            started = Future()
+            calls.append((t, started, executor.submit(self.call_tool, t, started)))
+        executor.shutdown(wait=False)
+        results = []
+        # calls beyond TOOL_WORKERS queue for a thread of this turn; each gets its full
+        # timeout from when it starts
+        start_wait = TOOL_TIMEOUT * len(calls)
+        # wait in call order so the ToolMessages keep the order of the tool calls
+        for t, started, future in calls:
+            timeout = TOOL_TIMEOUTS.get(t['name'], TOOL_TIMEOUT)
+            try:
+                deadline = started.result(timeout=start_wait) + timeout
+            except FutureTimeoutError:
+                future.cancel()
+                print(f"[TOOL] {t['name']} never started (waited {start_wait:g} s for a worker)")
+                result = {"success": False,
+                          "error": f"{t['name']} never started (waited {start_wait:g} s for a worker)"}
             else:
-                result = self.tools[t['name']].invoke(t['args'])
+                try:
+                    result = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+                except FutureTimeoutError:
+                    # the call can't be interrupted; it finishes in the background and is ignored
+                    future.cancel()
+                    print(f"[TOOL] {t['name']} timed out after {timeout:g} s")
+                    result = {"success": False, "error": f"{t['name']} timed out after {timeout:g} s"}
             results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=json.dumps(result)))
-        print("Back to the model!")
-        ret = {'messages': results}
+        tools_ms = (time.perf_counter() - start) * 1000
+        print(f"Back to the model! ({len(tool_calls)} tool calls in {tools_ms:.1f} ms)")
+        metrics = dict(state.get("metrics") or {})
+        metrics["tools_ms"] = metrics.get("tools_ms", 0.0) + tools_ms
+        ret = {'messages': results, 'metrics': metrics}
         if 'citation' in state:
             ret['citation'] = state['citation']
         return ret
     def run(self, query: str, thread: Dict = None):
         initial_messages = [HumanMessage(content=query)]
-        return self.graph.invoke(
-            {
-                "messages": initial_messages,
-                "citation": "",
-                "content": "",
-                "question_type": "",
-                "system_prompt": self.system
-            },
-            config=thread
-        )
+        request_id = str(uuid4())
+        try:
+            return self.graph.invoke(
+                {
+                    "messages": initial_messages,
+                    "citation": "",
+                    "content": "",
+                    "question_type": "",
+                    "system_prompt": self.system,
+                    "request_id": request_id,
+                    "metrics": {}
+                },
+                config=thread
+            )
+        finally:
+            self.discard_speculative(request_id)  # a request that failed before the RAG node
 prompt =''' You are a smart and friendly travel research assistant.
 
 You MUST follow these rules strictly:
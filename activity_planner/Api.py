@@ -17,5 +17,6 @@ async def ask(query: Query):
     result = agent.run(query.question, thread=thread)
 
     return {
-        "answer": result["messages"][-1].content
+        "answer": result["messages"][-1].content,
+        "metrics": result.get("metrics", {})
     }
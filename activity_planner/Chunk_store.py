@@ -0,0 +1,306 @@
+"""
+Compact, columnar chunk store used in place of the pickled langchain docstore.
+
+Chunk texts are stored back to back in one UTF-8 file addressed through an
+int64 offset array. Metadata is stored column by column: every field is an
+int32 array of codes into a shared string table holding each distinct
+value once (JSON-encoded, so numbers stay numbers). Titles, ids and sources
+repeat across all chunks of an article, so a chunk costs a few bytes of
+metadata instead of a dict of Python strings.
+
+Everything is memory-mapped on load, so opening a store is O(1) and API
+worker processes share the same page-cache pages instead of each
+unpickling a private copy. Documents are only materialized for the rows a
+search actually returns.
+
+Layout of a store directory:
+    texts.bin              concatenated chunk texts (UTF-8)
+    text_offsets.npy       int64[n + 1], chunk i is texts[off[i]:off[i + 1]]
+    strings.bin            concatenated JSON-encoded metadata values
+    string_offsets.npy     int64[m + 1]
+    columns.json           metadata field names, in column order
+    column_<k>.npy         int32[n] string codes of field k, -1 if missing
+    deleted.npy            uint8[n], 1 for rows removed by an index update
+
+Deleted rows keep their row number (it is also their faiss id) until the
+store is compacted into a new directory.
+"""
+
+import json
+import mmap
+import os
+import pickle
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+STRINGS_FILE = "strings.bin"
+STRING_OFFSETS_FILE = "string_offsets.npy"
+COLUMNS_FILE = "columns.json"
+DELETED_FILE = "deleted.npy"
+MISSING = -1
+
+
+def _column_file(position: int) -> str:
+    return f"column_{position}.npy"
+
+
+def _map_file(path: str):
+    """Read-only memory map of a file (empty files cannot be mapped)."""
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _save_array(path: str, values, dtype) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.asarray(values, dtype=dtype))
+    os.replace(tmp_path, path)
+
+
+class ChunkStoreWriter:
+    """
+    Append-only writer for a chunk store.
+
+    `flush()` makes everything appended so far durable and readable. Reopening
+    a directory truncates bytes written after the last flush, so a build that
+    was killed between checkpoints resumes from a consistent store.
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+        self.text_offsets = self._load_array(TEXT_OFFSETS_FILE, [0]).tolist()
+        self.string_offsets = self._load_array(STRING_OFFSETS_FILE, [0]).tolist()
+        self._texts = self._open_for_append(TEXTS_FILE, self.text_offsets[-1])
+        self._strings = self._open_for_append(STRINGS_FILE, self.string_offsets[-1])
+
+        # encoded value -> code; rebuilt from the string table when resuming
+        self.codes: Dict[bytes, int] = {}
+        if self.string_offsets[-1]:
+            with open(os.path.join(store_dir, STRINGS_FILE), "rb") as f:
+                data = f.read(self.string_offsets[-1])
+            for code in range(len(self.string_offsets) - 1):
+                self.codes[data[self.string_offsets[code]:self.string_offsets[code + 1]]] = code
+
+        self.fields: List[str] = []
+        self.columns: Dict[str, array] = {}
+        columns_path = os.path.join(store_dir, COLUMNS_FILE)
+        if os.path.exists(columns_path):
+            with open(columns_path, "r") as f:
+                self.fields = json.load(f)
+        for position, field in enumerate(self.fields):
+            codes = self._load_array(_column_file(position), [])[:len(self)]
+            self.columns[field] = array("i", codes.tolist())
+
+        self.deleted = bytearray(self._load_array(DELETED_FILE, []).astype(np.uint8)[:len(self)].tobytes())
+        self.deleted.extend(bytes(len(self) - len(self.deleted)))
+
+    def _load_array(self, name: str, default) -> np.ndarray:
+        path = os.path.join(self.store_dir, name)
+        if not os.path.exists(path):
+            return np.asarray(default, dtype=np.int64)
+        return np.load(path)
+
+    def _open_for_append(self, name: str, size: int):
+        f = open(os.path.join(self.store_dir, name), "ab")
+        f.truncate(size)
+        f.seek(size)
+        return f
+
+    def __len__(self) -> int:
+        return len(self.text_offsets) - 1
+
+    def _code(self, value) -> int:
+        encoded = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        code = self.codes.get(encoded)
+        if code is None:
+            code = self.codes[encoded] = len(self.string_offsets) - 1
+            self._strings.write(encoded)
+            self.string_offsets.append(self.string_offsets[-1] + len(encoded))
+        return code
+
+    def append(self, texts: Iterable[str], metadatas: Iterable[Dict]) -> None:
+        for text, metadata in zip(texts, metadatas):
+            row = len(self)
+            for field, value in metadata.items():
+                if field not in self.columns:
+                    self.fields.append(field)
+                    self.columns[field] = array("i", [MISSING]) * row
+                self.columns[field].append(self._code(value))
+            for codes in self.columns.values():
+                if len(codes) == row:
+                    codes.append(MISSING)
+
+            encoded_text = text.encode("utf-8")
+            self._texts.write(encoded_text)
+            self.text_offsets.append(self.text_offsets[-1] + len(encoded_text))
+            self.deleted.append(0)
+
+    def delete(self, rows: Iterable[int]) -> None:
+        for row in rows:
+            self.deleted[row] = 1
+
+    def live_count(self) -> int:
+        return len(self) - self.deleted.count(1)
+
+    def rows_by_value(self, field: str) -> Dict:
+        """Map every value of a metadata field to the live rows holding it."""
+        if field not in self.columns:
+            return {}
+        codes = np.frombuffer(self.columns[field], dtype=np.int32)
+        live = np.flatnonzero(np.frombuffer(self.deleted, dtype=np.uint8) == 0)
+        live = live[codes[live] != MISSING]
+        order = live[np.argsort(codes[live], kind="stable")]
+        values = {code: value for value, code in self.codes.items()}
+        groups = {}
+        if len(order):
+            boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+            for rows in np.split(order, boundaries):
+                groups[json.loads(values[int(codes[rows[0]])])] = rows
+        return groups
+
+    def truncate(self, size: int) -> None:
+        """Drop every chunk from row `size` on (rolls back to a checkpoint)."""
+        del self.text_offsets[size + 1:]
+        for codes in self.columns.values():
+            del codes[size:]
+        del self.deleted[size:]
+        self._texts.truncate(self.text_offsets[-1])
+        self._texts.seek(self.text_offsets[-1])
+
+    def flush(self) -> None:
+        self._texts.flush()
+        self._strings.flush()
+        os.fsync(self._texts.fileno())
+        os.fsync(self._strings.fileno())
+        _save_array(os.path.join(self.store_dir, STRING_OFFSETS_FILE), self.string_offsets, np.int64)
+        for position, field in enumerate(self.fields):
+            _save_array(os.path.join(self.store_dir, _column_file(position)), self.columns[field], np.int32)
+        tmp_path = os.path.join(self.store_dir, COLUMNS_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.fields, f)
+        os.replace(tmp_path, os.path.join(self.store_dir, COLUMNS_FILE))
+        _save_array(os.path.join(self.store_dir, DELETED_FILE), self.deleted, np.uint8)
+        # text offsets are written last and define the number of rows
+        _save_array(os.path.join(self.store_dir, TEXT_OFFSETS_FILE), self.text_offsets, np.int64)
+
+    def close(self) -> None:
+        self.flush()
+        self._texts.close()
+        self._strings.close()
+
+
+class RowIds(Mapping):
+    """
+    Identity mapping from faiss row number to docstore id.
+
+    Stands in for the `index_to_docstore_id` dict of the langchain FAISS
+    wrapper without allocating one Python string per chunk.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, row: int) -> str:
+        if not 0 <= row < self.size:
+            raise KeyError(row)
+        return str(row)
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class ChunkStore(Docstore):
+    """Read-only, memory-mapped chunk store usable as a langchain docstore."""
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.text_offsets = np.load(os.path.join(store_dir, TEXT_OFFSETS_FILE), mmap_mode="r")
+        self.string_offsets = np.load(os.path.join(store_dir, STRING_OFFSETS_FILE), mmap_mode="r")
+        self.texts = _map_file(os.path.join(store_dir, TEXTS_FILE))
+        self.strings = _map_file(os.path.join(store_dir, STRINGS_FILE))
+
+        with open(os.path.join(store_dir, COLUMNS_FILE), "r") as f:
+            self.fields = json.load(f)
+        self.columns = {
+            field: np.load(os.path.join(store_dir, _column_file(position)), mmap_mode="r")
+            for position, field in enumerate(self.fields)
+        }
+        deleted_path = os.path.join(store_dir, DELETED_FILE)
+        if os.path.exists(deleted_path):
+            self.deleted = np.load(deleted_path, mmap_mode="r")
+        else:
+            self.deleted = np.zeros(len(self), dtype=np.uint8)
+
+    @staticmethod
+    def exists(store_dir: str) -> bool:
+        return os.path.exists(os.path.join(store_dir, TEXT_OFFSETS_FILE))
+
+    def __len__(self) -> int:
+        return len(self.text_offsets) - 1
+
+    def live_count(self) -> int:
+        return len(self) - int(np.count_nonzero(self.deleted))
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(np.asarray(self.deleted) == 0)
+
+    def text(self, row: int) -> str:
+        start, end = self.text_offsets[row], self.text_offsets[row + 1]
+        return self.texts[start:end].decode("utf-8")
+
+    def value(self, code: int):
+        start, end = self.string_offsets[code], self.string_offsets[code + 1]
+        return json.loads(self.strings[start:end])
+
+    def get_metadata(self, row: int) -> Dict:
+        metadata = {}
+        for field, codes in self.columns.items():
+            code = int(codes[row])
+            if code != MISSING:
+                metadata[field] = self.value(code)
+        return metadata
+
+    def document(self, row: int) -> Document:
+        return Document(page_content=self.text(row), metadata=self.get_metadata(row))
+
+    def search(self, search: str) -> Union[str, Document]:
+        try:
+            row = int(search)
+        except ValueError:
+            return f"ID {search} not found."
+        if not 0 <= row < len(self) or self.deleted[row]:
+            return f"ID {search} not found."
+        return self.document(row)
+
+    def index_ids(self) -> RowIds:
+        return RowIds(len(self))
+
+
+def convert_pickled_docstore(index_dir: str, store_dir: str) -> None:
+    """
+    Write the docstore of an index saved with FAISS.save_local (index.pkl)
+    to a chunk store, in faiss row order.
+    """
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    writer = ChunkStoreWriter(store_dir)
+    writer.truncate(0)
+    for row in range(len(index_to_docstore_id)):
+        document = docstore.search(index_to_docstore_id[row])
+        writer.append([document.page_content], [document.metadata])
+    writer.close()
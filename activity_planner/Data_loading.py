@@ -1,56 +1,201 @@
 
 import os
+import gzip
+import io
+from collections import deque
+from itertools import groupby
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import json
 from langchain_core.documents import Document
 from glob import glob
-from langchain_community.document_loaders import JSONLoader
-
-
-def process_json_files(directory_path):
-    dir_paths = glob(directory_path + '/*')
-    documents = []
-    jq_schema = """
-    {
-    id: .id,
-    title: .title,
-    text: (
-        [
-        (if .intro then "INTRO:\\n" + .intro else null end),
-        (if .understand then "UNDERSTAND:\\n" + .understand else null end),
-        (if .get_in then "GET IN:\\n" + .get_in else null end),
-        (if .get_around then "GET AROUND:\\n" + .get_around else null end),
-        (if .see then "SEE:\\n" + .see else null end),
-        (if .eat then "EAT:\\n" + .eat else null end),
-        (if .drink then "DRINK:\\n" + .drink else null end),
-        (if .stay_safe then "STAY SAFE:\\n" + .stay_safe else null end),
-        (if .go_next then "GO NEXT:\\n" + .go_next else null end)
-        ]
-        | map(select(. != null))
-        | join("\\n\\n")
-    )
-    }
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# orjson parses JSONL several times faster; fall back to the stdlib parser
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Section fields of a sectioned article, in order, with the headings they are joined under
+SECTION_HEADINGS = [
+    ("intro", "INTRO"),
+    ("understand", "UNDERSTAND"),
+    ("get_in", "GET IN"),
+    ("get_around", "GET AROUND"),
+    ("see", "SEE"),
+    ("do", "DO"),
+    ("buy", "BUY"),
+    ("eat", "EAT"),
+    ("drink", "DRINK"),
+    ("sleep", "SLEEP"),
+    ("stay_safe", "STAY SAFE"),
+    ("stay_healthy", "STAY HEALTHY"),
+    ("respect", "RESPECT"),
+    ("go_next", "GO NEXT"),
+]
+
+# Layout of the loaded documents, part of every article hash:
+#   1  JSONLoader + jq: page_content was the serialized {id, title, text}
+#      and id/title were missing from the metadata
+#   2  one document per article, page_content the joined "HEADING:\n..." text
+#   3  one document per section, page_content the section's text and its
+#      field in the `section` metadata
+DOCUMENT_FORMAT = 3
+
+# "section" splits every WikiVoyage section on its own and records it in the
+# chunk metadata; "recursive" splits the whole article text as before
+CHUNKING = os.getenv("CHUNKING", "section")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+# overlap is stored and embedded twice; sections already end on natural breaks
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+
+
+def list_json_files(directory_path):
+    # <directory>/<AA>/wiki_00[.gz|.zst], sorted so every build sees the same order
+    return sorted(path for path in glob(directory_path + '/*/*') if os.path.isfile(path))
+
+
+def open_jsonl(file_path):
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    if file_path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstandard is required to read .zst files")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'))
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+
+def article_text(sections):
+    """The section documents of one article joined under their headings."""
+    headings = dict(SECTION_HEADINGS)
+    return "\n\n".join(f"{headings[section.metadata['section']]}:\n{section.page_content}"
+                       for section in sections)
+
+
+def load_json_records(file_path):
+    """Parse one sectioned JSONL file into one list of (text, metadata) pairs per article, one pair per section."""
+    records = []
+    seq_num = 0
+    with open_jsonl(file_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            article = json_loads(line)
+            seq_num += 1
+            metadata = {
+                # absolute, as JSONLoader recorded it; citations show it
+                "source": str(Path(file_path).resolve()),
+                "seq_num": seq_num,
+                "id": article.get("id", "Unknown"),
+                "title": article.get("title", "Unknown"),
+            }
+            # sections come straight from the record's fields, never from parsing text
+            sections = [(article[field], {**metadata, "section": field})
+                        for field, _ in SECTION_HEADINGS if article.get(field)]
+            if sections:
+                records.append(sections)
+    return records
+
+
+def iter_json_articles(directory_path, workers=1):
+    """
+    Lazily yield the section Documents of each article of the sectioned
+    WikiVoyage output, one list per article. Articles without sections are
+    skipped.
+
+    With workers > 1 files are parsed in a process pool; articles are still
+    yielded in sorted file order. At most 2 * workers files are parsed ahead
+    of the consumer, so memory stays bounded by a few files, not the corpus.
     """
-    for dir_path in dir_paths:
-        files = glob(dir_path + '/*')
+    files = list_json_files(directory_path)
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for file in files:
+                pending.append(executor.submit(load_json_records, file))
+                if len(pending) < 2 * workers:
+                    continue
+                for sections in pending.popleft().result():
+                    yield [Document(page_content=text, metadata=metadata) for text, metadata in sections]
+            while pending:
+                for sections in pending.popleft().result():
+                    yield [Document(page_content=text, metadata=metadata) for text, metadata in sections]
+    else:
         for file in files:
-        
-            loader = JSONLoader(
-                file_path=file,
-                jq_schema=jq_schema, # Replace '.text' with the key containing your data
-                text_content=False,
-                json_lines=True 
-            )
-            docs = loader.load()
-            documents.extend(docs)
-    return documents
-def create_chunks(documents):
-    text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200,
-    length_function=len,
-    )
-    chunks = text_splitter.split_documents(documents)
+            for sections in load_json_records(file):
+                yield [Document(page_content=text, metadata=metadata) for text, metadata in sections]
+
+
+def iter_json_documents(directory_path, workers=1):
+    """Lazily yield one Document per section, article by article."""
+    for sections in iter_json_articles(directory_path, workers=workers):
+        yield from sections
+
+
+def process_json_files(directory_path, workers=1):
+    return list(iter_json_documents(directory_path, workers=workers))
+
+
+def chunking_signature(strategy=CHUNKING, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    # part of every article hash, so changing the chunking (or the document
+    # layout) re-chunks on update
+    return f"{DOCUMENT_FORMAT}:{strategy}:{chunk_size}:{chunk_overlap}"
+
+
+def section_chunks(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Chunk every section document separately, so no chunk spans two
+    sections. Each chunk starts with its section heading and keeps the
+    section field (e.g. "eat") as `section` metadata.
+    """
+    headings = dict(SECTION_HEADINGS)
+    chunks = []
+    for document in documents:
+        body = document.page_content.strip()
+        if not body:
+            continue
+        prefix = f"{headings[document.metadata['section']]}:\n"
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size - len(prefix),
+            chunk_overlap=min(chunk_overlap, (chunk_size - len(prefix)) // 2),
+            length_function=len,
+        )
+        for piece in text_splitter.split_text(body):
+            chunks.append(Document(page_content=prefix + piece, metadata=dict(document.metadata)))
+    return chunks
+
+
+def article_documents(documents):
+    """Merge consecutive section documents of the same article into one joined document."""
+    articles = []
+    for _, sections in groupby(documents, key=lambda d: (d.metadata.get("source"), d.metadata.get("seq_num"))):
+        sections = list(sections)
+        metadata = {key: value for key, value in sections[0].metadata.items() if key != "section"}
+        articles.append(Document(page_content=article_text(sections), metadata=metadata))
+    return articles
+
+
+def create_chunks(documents, strategy=CHUNKING, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    if strategy == "section":
+        chunks = section_chunks(documents, chunk_size, chunk_overlap)
+    elif strategy == "recursive":
+        text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        )
+        chunks = text_splitter.split_documents(article_documents(documents))
+    else:
+        raise ValueError(f"Unknown chunking strategy {strategy!r}. Available: ['section', 'recursive']")
 
     # ensure metadata fields carry over into chunks
     for chunk in chunks:
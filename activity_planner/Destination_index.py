@@ -0,0 +1,240 @@
+"""
+Destination index: which chunk-store rows belong to which WikiVoyage article.
+
+Every chunk carries its article title, and an article's chunks are appended
+together, so a destination is a handful of contiguous row ranges. The RAG
+node looks the destination of a query up here and searches only those rows
+instead of the whole corpus, falling back to the global search when the
+query names no destination.
+
+Destinations are matched on normalized names (lowercase, accents and
+punctuation stripped):
+    - the full title ("Rio de Janeiro")
+    - the title without its disambiguator ("Paris (Texas)" -> "paris") and
+      the district of a district article ("London/Soho" -> "soho"), unless
+      several articles share the alias
+    - the abbreviations in DESTINATION_ALIASES
+and, when nothing matches exactly, by fuzzy match against names of similar
+length (misspellings such as "Barcelonna"). A fuzzy match must clear
+FUZZY_CUTOFF and beat the runner-up by FUZZY_MARGIN; a marginal one leaves
+the query to the global search, which is cheaper than scoping to the wrong
+article.
+
+A name only counts when it is written like one: its first and last words
+capitalized ("Rio de Janeiro", "Nice"), or, in an all-lowercase query, at
+least LOWERCASE_MIN_LENGTH characters long ("barcelona" but not "nice" or
+"best"). Travel topics and other non-destination articles ("Air travel",
+"Driving in Germany") are not matched at all.
+
+Layout of destinations.json:
+    titles     title -> [[first_row, last_row + 1], ...] over live rows
+    names      normalized name -> title
+"""
+
+import difflib
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from Chunk_store import MISSING, ChunkStore
+from Sparse_index import STOPWORDS
+
+# common abbreviations -> article title; ignored when the article doesn't exist
+DESTINATION_ALIASES = {
+    "nyc": "New York City",
+    "new york": "New York City",
+    "sf": "San Francisco",
+    "la": "Los Angeles",
+    "dc": "Washington, D.C.",
+    "washington dc": "Washington, D.C.",
+    "uk": "United Kingdom",
+    "usa": "United States of America",
+    "uae": "United Arab Emirates",
+    "hk": "Hong Kong",
+    "kl": "Kuala Lumpur",
+    "cdmx": "Mexico City",
+}
+# longest destination name tried, in words
+MAX_NAME_WORDS = 5
+# minimum difflib similarity for a fuzzy match
+FUZZY_CUTOFF = float(os.getenv("DESTINATION_FUZZY_CUTOFF", "0.9"))
+# a fuzzy match must beat the second-best name by this much
+FUZZY_MARGIN = 0.05
+# shorter words are too ambiguous to be fuzzy-matched
+FUZZY_MIN_LENGTH = 5
+# shortest uncapitalized name matched in an all-lowercase query ("nice", "best" are words)
+LOWERCASE_MIN_LENGTH = 5
+# lowercase words allowed inside a destination title ("Rio de Janeiro", "Isle of Man");
+# any other lowercase word marks a topic article ("Air travel", "Driving in Germany")
+NAME_PARTICLES = frozenset("""
+a al am an and aux d da das de dei del della der des di do dos du el en et la le les
+los of on op sur the til to upon van von y zu
+""".split())
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize_name(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(WORD_RE.findall(text.lower().replace("_", " ")))
+
+
+def title_aliases(title: str) -> List[str]:
+    """Shorter names an article is commonly referred to by."""
+    aliases = []
+    base = re.sub(r"\s*\([^)]*\)\s*$", "", title)
+    if base != title:
+        aliases.append(base)
+    if "/" in base:
+        aliases.append(base.rsplit("/", 1)[1])
+    return [normalize_name(alias) for alias in aliases]
+
+
+def is_destination_title(title: str) -> bool:
+    """True unless the title reads like a travel topic rather than a place name."""
+    base = re.sub(r"\s*\([^)]*\)\s*$", "", title)
+    for word in WORD_RE.findall(base):
+        if len(word) > 1 and word.islower() and word not in NAME_PARTICLES:
+            return False
+    return True
+
+
+def row_ranges(rows: np.ndarray) -> List[List[int]]:
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    return [[int(run[0]), int(run[-1]) + 1] for run in np.split(rows, breaks)]
+
+
+def build_destination_index(store_dir: str, path: str) -> None:
+    """Group the live rows of the chunk store in `store_dir` by article title."""
+    store = ChunkStore(store_dir)
+    titles: Dict[str, List[List[int]]] = {}
+    if "title" in store.columns:
+        codes = np.asarray(store.columns["title"])
+        live = store.live_rows()
+        live = live[codes[live] != MISSING]
+        order = live[np.argsort(codes[live], kind="stable")]
+        if len(order):
+            boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+            for rows in np.split(order, boundaries):
+                title = store.value(int(codes[rows[0]]))
+                if isinstance(title, str) and title != "Unknown":
+                    titles[title] = row_ranges(np.sort(rows))
+
+    names = {}
+    derived: Dict[str, set] = {}
+    for title in titles:
+        name = normalize_name(title)
+        if name:
+            names[name] = title
+        for alias in title_aliases(title):
+            if alias:
+                derived.setdefault(alias, set()).add(title)
+    # full titles win over derived aliases; ambiguous aliases are dropped
+    for alias, matches in derived.items():
+        if alias not in names and len(matches) == 1:
+            names[alias] = next(iter(matches))
+    for alias, title in DESTINATION_ALIASES.items():
+        if title in titles:
+            names.setdefault(alias, title)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"titles": titles, "names": names}, f)
+    os.replace(tmp_path, path)
+    print(f"Destination index: {len(titles)} destinations, {len(names)} names")
+
+
+class DestinationIndex:
+    """Detects destinations in a query and returns the rows of their chunks."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "r") as f:
+            data = json.load(f)
+        self.titles: Dict[str, List[List[int]]] = data["titles"]
+        # topic articles keep their rows but are never detected as destinations
+        self.names: Dict[str, str] = {name: title for name, title in data["names"].items()
+                                      if is_destination_title(title)}
+        # names bucketed by first letter and length, for fuzzy matching
+        self.buckets: Dict[Tuple[str, int], List[str]] = {}
+        for name in self.names:
+            self.buckets.setdefault((name[0], len(name)), []).append(name)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(path)
+
+    def _accept(self, words: List[Tuple[str, bool]], all_lowercase: bool) -> bool:
+        name = " ".join(word for word, _ in words)
+        if words[0][0] in STOPWORDS or words[-1][0] in STOPWORDS:
+            return False
+        if words[0][1] and words[-1][1]:
+            return len(name) >= 3 or name in DESTINATION_ALIASES
+        # lowercase spans only in all-lowercase queries, and only when long or a known abbreviation
+        return all_lowercase and (len(name) >= LOWERCASE_MIN_LENGTH or name in DESTINATION_ALIASES)
+
+    def _fuzzy(self, name: str) -> str:
+        candidates = []
+        for length in range(len(name) - 2, len(name) + 3):
+            candidates.extend(self.buckets.get((name[0], length), ()))
+        # score everything that could come within the margin of a match
+        floor = FUZZY_CUTOFF - FUZZY_MARGIN
+        scores = []
+        matcher = difflib.SequenceMatcher(b=name)
+        for candidate in candidates:
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() >= floor and matcher.quick_ratio() >= floor:
+                scores.append((matcher.ratio(), candidate))
+        scores.sort(reverse=True)
+        if not scores or scores[0][0] < FUZZY_CUTOFF:
+            return None
+        if len(scores) > 1 and scores[0][0] - scores[1][0] < FUZZY_MARGIN \
+                and self.names[scores[0][1]] != self.names[scores[1][1]]:
+            return None  # two destinations are about as close; don't guess
+        return self.names[scores[0][1]]
+
+    def detect(self, query: str) -> List[str]:
+        """Titles of the destinations named in `query`, longest names first."""
+        words = []
+        for word in WORD_RE.findall(query):
+            normalized = normalize_name(word)
+            if normalized:
+                words.append((normalized, word[:1].isupper()))
+        all_lowercase = query == query.lower()
+
+        found = []
+        taken = [False] * len(words)
+        for fuzzy in (False, True):
+            for size in range(min(MAX_NAME_WORDS, len(words)), 0, -1):
+                for start in range(len(words) - size + 1):
+                    if any(taken[start:start + size]):
+                        continue
+                    span = words[start:start + size]
+                    if not self._accept(span, all_lowercase):
+                        continue
+                    name = " ".join(word for word, _ in span)
+                    if fuzzy:
+                        if len(name) < FUZZY_MIN_LENGTH or size > 3:
+                            continue
+                        title = self._fuzzy(name)
+                    else:
+                        title = self.names.get(name)
+                    if title is None:
+                        continue
+                    taken[start:start + size] = [True] * size
+                    if title not in found:
+                        found.append(title)
+            if found:
+                break  # only fall back to fuzzy matching when nothing matched exactly
+        return found
+
+    def rows(self, titles: List[str]) -> np.ndarray:
+        ranges = [r for title in titles for r in self.titles.get(title, ())]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
@@ -0,0 +1,220 @@
+"""
+Embedding model factory with selectable CPU backends.
+
+    torch       sentence-transformers on PyTorch (default)
+    onnx        the same model on ONNX Runtime
+    onnx_int8   ONNX Runtime with the dynamically int8-quantized export
+
+The ONNX backends go through sentence-transformers' `backend="onnx"`
+support, so tokenization, pooling and normalization are unchanged; only
+the transformer forward pass moves to ONNX Runtime. Select a backend with
+EMBEDDING_BACKEND and check it against the PyTorch path with:
+
+    python activity_planner/Embedding_backend.py --backend onnx_int8
+"""
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from Chunk_store import ChunkStore
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+BACKENDS = ("torch", "onnx", "onnx_int8")
+# texts per forward pass when encoding the corpus (sentence-transformers
+# already sorts each call by length, so padding stays small)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# quantized export shipped in the model repo; on AVX-512 hosts
+# onnx/model_qint8_avx512_vnni.onnx is faster
+ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+# concurrent queries are coalesced for at most this long before encoding
+QUERY_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_QUERY_WAIT_MS", "2"))
+QUERY_MAX_BATCH = int(os.getenv("EMBEDDING_QUERY_MAX_BATCH", "32"))
+
+# minimum cosine similarity to the PyTorch embeddings of the same text
+PARITY_TOLERANCE = {"torch": 1.0 - 1e-6, "onnx": 0.999, "onnx_int8": 0.98}
+
+PARITY_SAMPLE_TEXTS = [
+    "What are the best things to see in Kyoto?",
+    "Is it safe to travel to Rio de Janeiro at night?",
+    "How do I get from Heathrow airport to central London?",
+    "Cheap places to eat in Bangkok",
+    "The old town is best explored on foot; most sights are within walking distance.",
+    "Buses leave every 20 minutes from the main station and tickets can be bought on board.",
+    "Tap water is safe to drink, but avoid ice from street vendors.",
+    "Go next: the coastal road continues south to the fishing villages.",
+]
+
+
+def backend_model_kwargs(backend: str) -> dict:
+    if backend == "torch":
+        return {}
+    if backend == "onnx":
+        return {"backend": "onnx"}
+    if backend == "onnx_int8":
+        return {"backend": "onnx", "model_kwargs": {"file_name": ONNX_INT8_FILE}}
+    raise ValueError(f"Unknown embedding backend {backend!r}. Available: {list(BACKENDS)}")
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item calls into batched calls.
+
+    Callers block in `submit(item)`. A background thread takes whatever is
+    queued, waits up to `max_wait_ms` for more (or until `max_batch` items),
+    and passes the whole batch to `batch_fn`, so concurrent requests share
+    one forward pass instead of queueing for the model one by one.
+    """
+
+    def __init__(self, batch_fn: Callable[[List], List], max_batch: int = QUERY_MAX_BATCH,
+                 max_wait_ms: float = QUERY_BATCH_WAIT_MS):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        self._ensure_thread()
+        return future.result()
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+class BatchedQueryEmbeddings(Embeddings):
+    """
+    Embeddings whose `embed_query` calls from concurrent requests are
+    encoded together. Only valid for symmetric models, where a query is
+    encoded exactly like a document (true for all-MiniLM-L6-v2).
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch: int = QUERY_MAX_BATCH,
+                 max_wait_ms: float = QUERY_BATCH_WAIT_MS):
+        self.embeddings = embeddings
+        self.batcher = MicroBatcher(embeddings.embed_documents, max_batch, max_wait_ms)
+
+    def __getattr__(self, name):
+        # expose model_name / model_kwargs of the wrapped model
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit(text)
+
+
+def create_embeddings(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL,
+                      batch_queries: bool = False) -> Embeddings:
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=backend_model_kwargs(backend),
+        encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE}
+    )
+    if batch_queries:
+        return BatchedQueryEmbeddings(embeddings)
+    return embeddings
+
+
+def check_parity(backend: str, texts: Optional[List[str]] = None, reference: str = "torch",
+                 tolerance: Optional[float] = None) -> dict:
+    """
+    Compare `backend` with the `reference` backend on the same texts.
+
+    Reports the per-text cosine similarity of the two embeddings, single-query
+    latency and batch throughput of both. `passed` is False when any text
+    falls below the backend's tolerance.
+    """
+    texts = texts or PARITY_SAMPLE_TEXTS
+    tolerance = PARITY_TOLERANCE[backend] if tolerance is None else tolerance
+    report = {"backend": backend, "reference": reference, "texts": len(texts), "tolerance": tolerance}
+
+    vectors = {}
+    for name in (reference, backend):
+        embeddings = create_embeddings(name)
+        embeddings.embed_query(texts[0])  # warm-up: model load, ONNX session init
+
+        start = time.perf_counter()
+        for text in texts[:50]:
+            embeddings.embed_query(text)
+        report[f"{name}_query_ms"] = (time.perf_counter() - start) * 1000 / min(len(texts), 50)
+
+        start = time.perf_counter()
+        vectors[name] = np.asarray(embeddings.embed_documents(texts), dtype="float32")
+        report[f"{name}_texts_per_sec"] = len(texts) / (time.perf_counter() - start)
+
+    a, b = vectors[reference], vectors[backend]
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    report["min_cosine"] = float(cosine.min())
+    report["mean_cosine"] = float(cosine.mean())
+    report["passed"] = bool(cosine.min() >= tolerance)
+    return report
+
+
+def load_sample_chunks(index_dir: str, count: int) -> List[str]:
+    """Evenly spaced chunk texts from a built index, for parity on real data."""
+    store_dir = os.path.join(index_dir, "chunks")
+    if count <= 0 or not ChunkStore.exists(store_dir):
+        return []
+    store = ChunkStore(store_dir)
+    rows = store.live_rows()
+    return [store.text(int(row)) for row in rows[np.linspace(0, len(rows) - 1, min(count, len(rows))).astype(int)]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check an embedding backend against PyTorch")
+    parser.add_argument("--backend", choices=BACKENDS, default="onnx_int8")
+    parser.add_argument("--chunks", type=int, default=500,
+                        help="Corpus chunks added to the sample texts (from faiss_index/chunks)")
+    parser.add_argument("--tolerance", type=float, default=None, help="Minimum cosine similarity")
+    args = parser.parse_args()
+
+    texts = PARITY_SAMPLE_TEXTS + load_sample_chunks("faiss_index", args.chunks)
+    report = check_parity(args.backend, texts, tolerance=args.tolerance)
+    for key, value in report.items():
+        print(f"{key:>22}: {value:.4f}" if isinstance(value, float) else f"{key:>22}: {value}")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
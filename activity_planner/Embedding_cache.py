@@ -0,0 +1,198 @@
+"""
+Persistent embedding cache keyed by hash(model name, text).
+
+Index rebuilds re-embed mostly byte-identical chunks, and evaluation runs
+re-embed the same questions and answers. CachedEmbeddings wraps any
+langchain Embeddings object and only sends texts it has never seen to the
+underlying model, so rebuild time scales with changed content rather than
+corpus size.
+
+Layout of a cache directory (one per model):
+    keys.u64       uint64[n] 8-byte blake2b digests, in row order
+    vectors.f32    float32[n, dim] embeddings, in row order
+    meta.json      model name, dimension and the number of committed rows
+
+Vectors are stored as float32 so cached and freshly computed embeddings are
+identical. Rows are read through a memory map; `meta.json` is written after
+the data files, so a crash at worst loses the rows of the last call. The
+cache expects a single writing process (an index build or an eval run).
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# empty string disables the cache
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+
+# keys of this session are folded into the sorted arrays after this many
+# inserts, so a full-corpus build doesn't keep a dict entry (~100 bytes) per chunk
+MERGE_EVERY = 65536
+
+KEYS_FILE = "keys.u64"
+VECTORS_FILE = "vectors.f32"
+META_FILE = "meta.json"
+
+
+def model_identity(embeddings: Embeddings) -> str:
+    """Model name, qualified by the runtime backend unless it is plain PyTorch."""
+    name = getattr(embeddings, "model_name", None) or type(embeddings).__name__
+    model_kwargs = getattr(embeddings, "model_kwargs", None) or {}
+    backend = model_kwargs.get("backend", "torch")
+    if backend != "torch":
+        # ONNX and quantized exports produce slightly different vectors
+        file_name = (model_kwargs.get("model_kwargs") or {}).get("file_name")
+        name += f"@{backend}" + (f":{file_name}" if file_name else "")
+    return name
+
+
+def text_key(model_name: str, kind: str, text: str) -> int:
+    digest = hashlib.blake2b(digest_size=8)
+    for part in (model_name, kind, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return int.from_bytes(digest.digest(), "little")
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that reads from and appends to an on-disk cache."""
+
+    def __init__(self, embeddings: Embeddings, model_name: Optional[str] = None,
+                 cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.embeddings = embeddings
+        self.model_name = model_name or model_identity(embeddings)
+        self.cache_dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", self.model_name))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.dim = None
+        rows = 0
+        meta_path = os.path.join(self.cache_dir, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            rows = self._committed_rows(meta["rows"])
+
+        keys_path = os.path.join(self.cache_dir, KEYS_FILE)
+        keys = np.fromfile(keys_path, dtype=np.uint64, count=rows) if rows else np.empty(0, np.uint64)
+        # sorted keys + their rows, and a dict for the rows added since the last merge
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+        self._new_rows: Dict[int, int] = {}
+        self.rows = rows
+
+        self._keys_file = self._open_for_append(KEYS_FILE, rows * 8)
+        self._vectors_file = self._open_for_append(VECTORS_FILE, rows * 4 * (self.dim or 0))
+        self._vectors = None
+
+    def _committed_rows(self, rows: int) -> int:
+        # rows whose key and vector both reached the disk
+        keys_size = os.path.getsize(os.path.join(self.cache_dir, KEYS_FILE))
+        vectors_size = os.path.getsize(os.path.join(self.cache_dir, VECTORS_FILE))
+        return min(rows, keys_size // 8, vectors_size // (4 * self.dim))
+
+    def _open_for_append(self, name: str, size: int):
+        f = open(os.path.join(self.cache_dir, name), "ab")
+        f.truncate(size)
+        f.seek(size)
+        return f
+
+    def _lookup(self, key: int) -> int:
+        row = self._new_rows.get(key)
+        if row is not None:
+            return row
+        position = np.searchsorted(self._sorted_keys, np.uint64(key))
+        if position < len(self._sorted_keys) and self._sorted_keys[position] == key:
+            return int(self._order[position])
+        return -1
+
+    def _merge(self) -> None:
+        """Fold the rows added since the last merge into the sorted key/row arrays."""
+        if not self._new_rows:
+            return
+        keys = np.fromiter(self._new_rows.keys(), dtype=np.uint64, count=len(self._new_rows))
+        rows = np.fromiter(self._new_rows.values(), dtype=np.int64, count=len(self._new_rows))
+        by_key = np.argsort(keys, kind="stable")
+        keys, rows = keys[by_key], rows[by_key]
+        positions = np.searchsorted(self._sorted_keys, keys)
+        self._sorted_keys = np.insert(self._sorted_keys, positions, keys)
+        self._order = np.insert(self._order, positions, rows)
+        self._new_rows.clear()
+
+    def _read(self, rows: List[int]) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) < self.rows:
+            self._vectors = np.memmap(os.path.join(self.cache_dir, VECTORS_FILE), dtype=np.float32,
+                                      mode="r", shape=(self.rows, self.dim))
+        return np.asarray(self._vectors[rows])
+
+    def _append(self, keys: List[int], vectors: np.ndarray) -> None:
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        self._keys_file.write(np.asarray(keys, dtype=np.uint64).tobytes())
+        self._vectors_file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._keys_file.flush()
+        self._vectors_file.flush()
+        for key in keys:
+            self._new_rows[key] = self.rows
+            self.rows += 1
+        if len(self._new_rows) >= MERGE_EVERY:
+            self._merge()
+
+        tmp_path = os.path.join(self.cache_dir, META_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "rows": self.rows}, f)
+        os.replace(tmp_path, os.path.join(self.cache_dir, META_FILE))
+
+    def _embed(self, texts: List[str], kind: str) -> np.ndarray:
+        keys = [text_key(self.model_name, kind, text) for text in texts]
+        with self._lock:
+            rows = [self._lookup(key) for key in keys]
+        # embed each missing text once, even if it repeats within the call
+        missing = {}
+        for key, text, row in zip(keys, texts, rows):
+            if row < 0 and key not in missing:
+                missing[key] = text
+
+        # the model runs without the lock, so concurrent callers embed in parallel
+        computed = None
+        if missing:
+            if kind == "query":
+                computed = [self.embeddings.embed_query(text) for text in missing.values()]
+            else:
+                computed = self.embeddings.embed_documents(list(missing.values()))
+
+        with self._lock:
+            if missing:
+                # another caller may have stored some of the same texts meanwhile
+                new = [(key, vector) for key, vector in zip(missing, computed) if self._lookup(key) < 0]
+                if new:
+                    self._append([key for key, _ in new], np.asarray([v for _, v in new], dtype=np.float32))
+                rows = [self._lookup(key) for key in keys]
+
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+            if not texts:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            return self._read(rows)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "document").tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0].tolist()
+
+
+def cached_embeddings(embeddings: Embeddings, model_name: Optional[str] = None) -> Embeddings:
+    """Wrap `embeddings` in the persistent cache unless it is disabled or already cached."""
+    if not EMBEDDING_CACHE_DIR or isinstance(embeddings, CachedEmbeddings):
+        return embeddings
+    return CachedEmbeddings(embeddings, model_name=model_name)
@@ -1,37 +1,504 @@
-from Data_loading import create_chunks, process_json_files
+from Data_loading import article_text, chunking_signature, create_chunks, iter_json_articles
+from Chunk_store import ChunkStore, ChunkStoreWriter, convert_pickled_docstore
+from Embedding_backend import create_embeddings
+from Embedding_cache import cached_embeddings
+from Sparse_index import SparseIndex, build_sparse_index
+from Destination_index import DestinationIndex, build_destination_index
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from itertools import islice
+import faiss
+import numpy as np
+import argparse
+import hashlib
+import json
 import os
+import resource
+import shutil
+import sys
+import time
 
+INDEX_DIR = "faiss_index"
+DATA_DIR = "Data_preparation/enwikivoyage-sectioned"
 
+# chunks embedded per batch; bounds the strings and vectors held in memory
+EMBED_BATCH_SIZE = 512
+# save a resumable checkpoint after at least this many new chunks
+CHECKPOINT_EVERY = 50_000
+PROGRESS_FILE = "progress.json"
+INDEX_FILE = "index.faiss"
+CHUNKS_DIR = "chunks"
+SPARSE_DIR = "sparse"
+# article title -> chunk-store rows, for destination-scoped search
+DESTINATIONS_FILE = "destinations.json"
+# article id -> content hash, used by update_index to skip unchanged articles
+ARTICLES_FILE = "articles.json"
+# compact once this fraction of chunk-store rows has been deleted by updates
+COMPACT_RATIO = float(os.getenv("FAISS_COMPACT_RATIO", "0.2"))
 
-def faiss_index():
+# ANN index configuration; the index type is fixed at build time, the
+# search knobs (nprobe / efSearch) are applied every time an index is loaded
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "1024"))
+PQ_M = int(os.getenv("FAISS_PQ_M", "48"))  # 384 dims / 48 = 8 dims per sub-quantizer
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+# vectors collected before training quantizers (IVF centroids, PQ/SQ codebooks)
+TRAIN_SIZE = int(os.getenv("FAISS_TRAIN_SIZE", "50000"))
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8")
+TRAINED_INDEX_TYPES = ("ivf_flat", "ivf_pq", "sq8")
+
+
+def peak_memory_mb():
+    # ru_maxrss is reported in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def index_factory_string(index_type, num_training_vectors):
+    # faiss wants ~39 training points per IVF list; shrink nlist for small corpora
+    nlist = max(1, min(IVF_NLIST, num_training_vectors // 39))
+    factories = {
+        "flat": "Flat",
+        "ivf_flat": f"IVF{nlist},Flat",
+        "ivf_pq": f"IVF{nlist},PQ{PQ_M}",
+        "hnsw": f"HNSW{HNSW_M}",
+        "sq8": "SQ8",
+    }
+    if index_type not in factories:
+        raise ValueError(f"Unknown index type {index_type!r}. Available: {list(factories)}")
+    return factories[index_type]
+
+
+def configure_search(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # the parameter does not apply to this index type
+    return index
+
+
+def make_index(index_type, training_vectors):
+    """Create an empty faiss index of the given type, trained on `training_vectors`."""
+    vectors = np.asarray(training_vectors, dtype="float32")
+    index = faiss.index_factory(vectors.shape[1], index_factory_string(index_type, len(vectors)))
+    if not index.is_trained:
+        index.train(vectors)
+    return configure_search(index)
+
+
+def read_index_mmap(index_path):
+    # Memory-mapped indexes are shared between worker processes through the
+    # page cache; fall back to a normal read for types this faiss can't mmap
+    flag_options = [faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY]
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        flag_options.insert(0, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    for flags in flag_options:
+        try:
+            return faiss.read_index(index_path, flags)
+        except RuntimeError:
+            continue
+    return faiss.read_index(index_path)
 
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
+
+def load_vectorstore(embeddings, index_dir=INDEX_DIR):
+    store_dir = os.path.join(index_dir, CHUNKS_DIR)
+    if not ChunkStore.exists(store_dir):
+        # indexes built before the chunk store carry a pickled docstore;
+        # convert it once so every later load is memory-mapped
+        print("Converting pickled docstore to a chunk store")
+        # such indexes hold document format 1 (serialized JSON page_content)
+        print("Warning: this index predates the plain-text document format; "
+              "run `Faiss_indexing.py --update` to re-chunk it")
+        convert_pickled_docstore(index_dir, store_dir)
+
+    store = ChunkStore(store_dir)
+    index = configure_search(read_index_mmap(os.path.join(index_dir, INDEX_FILE)))
+    if index.ntotal != store.live_count():
+        raise ValueError(f"{index_dir} is inconsistent: {index.ntotal} vectors, {store.live_count()} chunks")
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=store,
+        index_to_docstore_id=store.index_ids()
     )
-    if os.path.exists("faiss_index"):
-        print("Loading existing index")
 
-        vectorstore = FAISS.load_local(
-            "faiss_index",
-            embeddings,
-            allow_dangerous_deserialization=True
+
+def article_hash(sections):
+    content = chunking_signature() + "\n" + sections[0].metadata.get("title", "") + "\n" + article_text(sections)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def load_article_hashes(index_dir):
+    path = os.path.join(index_dir, ARTICLES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_article_hashes(index_dir, hashes):
+    tmp_path = os.path.join(index_dir, ARTICLES_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(hashes, f)
+    os.replace(tmp_path, os.path.join(index_dir, ARTICLES_FILE))
+
+
+def load_checkpoint(checkpoint_dir):
+    progress_path = os.path.join(checkpoint_dir, PROGRESS_FILE)
+    if not os.path.exists(progress_path):
+        # nothing was checkpointed; discard whatever a killed build left behind
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        return None, {"documents": 0, "chunks": 0}
+    with open(progress_path, "r") as f:
+        progress = json.load(f)
+    index = faiss.read_index(os.path.join(checkpoint_dir, INDEX_FILE))
+    return index, progress
+
+
+def save_checkpoint(checkpoint_dir, index, writer, progress, hashes):
+    writer.flush()
+    tmp_path = os.path.join(checkpoint_dir, INDEX_FILE + ".tmp")
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, os.path.join(checkpoint_dir, INDEX_FILE))
+    save_article_hashes(checkpoint_dir, hashes)
+    # progress is written last: it only ever points at a fully saved index
+    tmp_path = os.path.join(checkpoint_dir, PROGRESS_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, os.path.join(checkpoint_dir, PROGRESS_FILE))
+
+
+def id_mapped(index):
+    """
+    Return `index` addressed by chunk-store row instead of by position.
+
+    IVF indexes store ids natively; other types are wrapped in an
+    IndexIDMap2. Indexes built before rows were used as ids hold row i at
+    position i, so their vectors are re-added under the same ids.
+    """
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF)):
+        return index
+    empty = faiss.clone_index(index)
+    empty.reset()
+    mapped = faiss.IndexIDMap2(empty)
+    if index.ntotal:
+        mapped.add_with_ids(index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype="int64"))
+    return mapped
+
+
+def add_batch(index, writer, embeddings, texts, metadatas, index_type=INDEX_TYPE):
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype="float32")
+    if index is None:
+        # The first batch doubles as the training sample for quantized indexes
+        index = id_mapped(make_index(index_type, vectors))
+    # faiss ids are chunk-store rows, so deleted rows never shift the others
+    rows = np.arange(len(writer), len(writer) + len(texts), dtype="int64")
+    index.add_with_ids(vectors, rows)
+    writer.append(texts, metadatas)
+    return index
+
+
+def print_cache_stats(encoder):
+    if hasattr(encoder, "hits"):
+        print(f"Embedding cache: {encoder.hits} hits, {encoder.misses} chunks embedded")
+
+
+def publish(staging_dir, index_dir):
+    # Swap a finished build or update in place of the live index
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    os.replace(staging_dir, index_dir)
+
+
+def build_index_streaming(embeddings, data_dir=DATA_DIR, index_dir=INDEX_DIR,
+                          batch_size=EMBED_BATCH_SIZE, checkpoint_every=CHECKPOINT_EVERY,
+                          index_type=INDEX_TYPE):
+    """
+    Build the FAISS index without holding the corpus in memory.
+
+    Documents are read and chunked one at a time, embedded in fixed-size
+    batches and added to the index incrementally, while chunk texts and
+    metadata are appended to an on-disk ChunkStore. A checkpoint is written
+    to <index_dir>.partial every `checkpoint_every` chunks, so a killed build
+    resumes from the last checkpoint instead of starting over.
+
+    For IVF, PQ and SQ8 indexes the first batch is grown to TRAIN_SIZE chunks
+    and used to train the quantizers before anything is added.
+
+    Chunks are embedded through the persistent embedding cache, so only
+    chunk texts that were never embedded before reach the model.
+    """
+    encoder = cached_embeddings(embeddings)
+    checkpoint_dir = index_dir + ".partial"
+    index, progress = load_checkpoint(checkpoint_dir)
+    writer = ChunkStoreWriter(os.path.join(checkpoint_dir, CHUNKS_DIR))
+    hashes = load_article_hashes(checkpoint_dir)
+    if progress["documents"]:
+        print(f"Resuming from checkpoint: {progress['documents']} documents, "
+              f"{progress['chunks']} chunks")
+    if len(writer) < progress["chunks"]:
+        raise ValueError(f"Checkpoint in {checkpoint_dir} is inconsistent; delete it and rebuild")
+    # chunks flushed after the last saved index are re-embedded on resume
+    writer.truncate(progress["chunks"])
+
+    articles = islice(iter_json_articles(data_dir), progress["documents"], None)
+    texts, metadatas = [], []
+    documents_in_batch = 0
+    chunks_since_checkpoint = 0
+    new_chunks = 0
+    start = time.perf_counter()
+
+    for sections in articles:
+        for chunk in create_chunks(sections):
+            texts.append(chunk.page_content)
+            metadatas.append(chunk.metadata)
+        hashes[sections[0].metadata["id"]] = article_hash(sections)
+        documents_in_batch += 1
+
+        # Batches end on document boundaries so progress counts whole documents
+        min_batch = batch_size
+        if index is None and index_type in TRAINED_INDEX_TYPES:
+            min_batch = max(batch_size, TRAIN_SIZE)
+        if len(texts) < min_batch:
+            continue
+
+        index = add_batch(index, writer, encoder, texts, metadatas, index_type)
+        progress["documents"] += documents_in_batch
+        progress["chunks"] += len(texts)
+        new_chunks += len(texts)
+        chunks_since_checkpoint += len(texts)
+        texts, metadatas = [], []
+        documents_in_batch = 0
+
+        elapsed = time.perf_counter() - start
+        print(f"  {progress['chunks']} chunks indexed "
+              f"({new_chunks / elapsed:.1f} chunks/sec, peak memory {peak_memory_mb():.0f} MB)")
+
+        if chunks_since_checkpoint >= checkpoint_every:
+            save_checkpoint(checkpoint_dir, index, writer, progress, hashes)
+            chunks_since_checkpoint = 0
+
+    if texts:
+        index = add_batch(index, writer, encoder, texts, metadatas, index_type)
+        progress["documents"] += documents_in_batch
+        progress["chunks"] += len(texts)
+        new_chunks += len(texts)
+
+    if index is None:
+        raise ValueError(f"No documents found in {data_dir}")
+
+    # Publish the finished index in place of any previous one
+    save_checkpoint(checkpoint_dir, index, writer, progress, hashes)
+    writer.close()
+    build_sparse_index(os.path.join(checkpoint_dir, CHUNKS_DIR), os.path.join(checkpoint_dir, SPARSE_DIR))
+    build_destination_index(os.path.join(checkpoint_dir, CHUNKS_DIR), os.path.join(checkpoint_dir, DESTINATIONS_FILE))
+    os.remove(os.path.join(checkpoint_dir, PROGRESS_FILE))
+    publish(checkpoint_dir, index_dir)
+
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {progress['chunks']} chunks from {progress['documents']} documents "
+          f"into a {index_type} index "
+          f"in {elapsed:.1f}s ({new_chunks / max(elapsed, 1e-9):.1f} chunks/sec, "
+          f"peak memory {peak_memory_mb():.0f} MB)")
+    print_cache_stats(encoder)
+    return load_vectorstore(embeddings, index_dir)
+
+
+def remove_rows(index, rows):
+    # HNSW graphs can't drop vectors in place; the caller compacts instead
+    if not len(rows):
+        return True
+    try:
+        index.remove_ids(np.asarray(rows, dtype="int64"))
+    except RuntimeError:
+        return False
+    return True
+
+
+def compact_index(index, index_dir, batch_size=65536):
+    """
+    Drop deleted rows for good.
+
+    Live chunks are copied to a fresh chunk store and their vectors are
+    reconstructed from the index into a fresh index of the same type, so
+    rows and faiss ids are dense again. Nothing is re-embedded and trained
+    quantizers are reused as they are.
+    """
+    store_dir = os.path.join(index_dir, CHUNKS_DIR)
+    compacted_dir = store_dir + ".compacted"
+    if os.path.exists(compacted_dir):
+        shutil.rmtree(compacted_dir)
+
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexIVF):
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    compacted = faiss.clone_index(base)
+    compacted.reset()
+    if isinstance(compacted, faiss.IndexIVF):
+        compacted.set_direct_map_type(faiss.DirectMap.NoMap)
+    compacted = id_mapped(compacted)
+
+    store = ChunkStore(store_dir)
+    writer = ChunkStoreWriter(compacted_dir)
+    live_rows = store.live_rows()
+    for start in range(0, len(live_rows), batch_size):
+        rows = live_rows[start:start + batch_size]
+        new_rows = np.arange(start, start + len(rows), dtype="int64")
+        compacted.add_with_ids(index.reconstruct_batch(rows.astype("int64")), new_rows)
+        writer.append(
+            [store.text(row) for row in rows],
+            [store.get_metadata(row) for row in rows]
         )
+    writer.close()
+
+    shutil.rmtree(store_dir)
+    os.replace(compacted_dir, store_dir)
+    print(f"Compacted index: {len(store) - len(live_rows)} deleted rows dropped, "
+          f"{len(live_rows)} kept")
+    return configure_search(compacted)
+
+
+def update_index(embeddings, data_dir=DATA_DIR, index_dir=INDEX_DIR,
+                 batch_size=EMBED_BATCH_SIZE, compact_ratio=COMPACT_RATIO, compact=False):
+    """
+    Bring an existing index in line with `data_dir` without a full rebuild.
+
+    Articles are matched by their WikiVoyage id and compared by content
+    hash. Only new or changed articles are re-chunked and re-embedded; the
+    rows of changed and removed articles are deleted from the index and
+    tombstoned in the chunk store. The index is compacted once deleted rows
+    exceed `compact_ratio` of the store, and always for HNSW, which can't
+    delete in place. Indexes built before article hashes were recorded are
+    fully re-embedded by their first update.
+
+    The update is staged in <index_dir>.update and published with the same
+    swap as a full build, so readers never see a half-applied update.
+    """
+    if not os.path.exists(index_dir):
+        raise FileNotFoundError(f"No index at {index_dir}; build one first")
+    if not ChunkStore.exists(os.path.join(index_dir, CHUNKS_DIR)):
+        load_vectorstore(embeddings, index_dir)  # converts a pickled docstore
+
+    staging_dir = index_dir + ".update"
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    shutil.copytree(index_dir, staging_dir)
+    encoder = cached_embeddings(embeddings)
+
+    index = id_mapped(faiss.read_index(os.path.join(staging_dir, INDEX_FILE)))
+    writer = ChunkStoreWriter(os.path.join(staging_dir, CHUNKS_DIR))
+    hashes = load_article_hashes(staging_dir)
+    article_rows = writer.rows_by_value("id")
+
+    counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+    stale_rows = []
+    seen = set()
+    texts, metadatas = [], []
+    start = time.perf_counter()
+
+    for sections in iter_json_articles(data_dir):
+        article_id = sections[0].metadata["id"]
+        seen.add(article_id)
+        digest = article_hash(sections)
+        if hashes.get(article_id) == digest:
+            counts["unchanged"] += 1
+            continue
+
+        counts["changed" if article_id in article_rows else "added"] += 1
+        hashes[article_id] = digest
+        stale_rows.extend(article_rows.get(article_id, ()))
+        for chunk in create_chunks(sections):
+            texts.append(chunk.page_content)
+            metadatas.append(chunk.metadata)
+        if len(texts) >= batch_size:
+            add_batch(index, writer, encoder, texts, metadatas)
+            texts, metadatas = [], []
+
+    if texts:
+        add_batch(index, writer, encoder, texts, metadatas)
+
+    for article_id in (set(article_rows) | set(hashes)) - seen:
+        stale_rows.extend(article_rows.get(article_id, ()))
+        hashes.pop(article_id, None)
+        counts["removed"] += 1
+
+    writer.delete(stale_rows)
+    removed_in_place = remove_rows(index, stale_rows)
+    writer.close()
+
+    deleted = len(writer) - writer.live_count()
+    if compact or not removed_in_place or deleted > compact_ratio * len(writer):
+        index = compact_index(index, staging_dir)
+
+    faiss.write_index(index, os.path.join(staging_dir, INDEX_FILE))
+    save_article_hashes(staging_dir, hashes)
+    build_sparse_index(os.path.join(staging_dir, CHUNKS_DIR), os.path.join(staging_dir, SPARSE_DIR))
+    build_destination_index(os.path.join(staging_dir, CHUNKS_DIR), os.path.join(staging_dir, DESTINATIONS_FILE))
+    publish(staging_dir, index_dir)
+
+    print(f"Updated index in {time.perf_counter() - start:.1f}s: "
+          f"{counts['added']} added, {counts['changed']} changed, "
+          f"{counts['removed']} removed, {counts['unchanged']} unchanged articles")
+    print_cache_stats(encoder)
+    return load_vectorstore(embeddings, index_dir)
+
+
+def sparse_index(index_dir=INDEX_DIR):
+    sparse_dir = os.path.join(index_dir, SPARSE_DIR)
+    if not SparseIndex.exists(sparse_dir):
+        # indexes built before hybrid search get their BM25 index on first use
+        print("Building sparse index")
+        build_sparse_index(os.path.join(index_dir, CHUNKS_DIR), sparse_dir)
+    return SparseIndex(sparse_dir)
+
+
+def index_version(index_dir=INDEX_DIR):
+    # every build or update publishes a freshly written index file
+    stat = os.stat(os.path.join(index_dir, INDEX_FILE))
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def destination_index(index_dir=INDEX_DIR):
+    path = os.path.join(index_dir, DESTINATIONS_FILE)
+    if not DestinationIndex.exists(path):
+        print("Building destination index")
+        build_destination_index(os.path.join(index_dir, CHUNKS_DIR), path)
+    return DestinationIndex(path)
+
+
+def faiss_index():
+
+    # concurrent requests share one forward pass for their query embeddings
+    embeddings = create_embeddings(batch_queries=True)
+    if os.path.exists(INDEX_DIR):
+        print("Loading existing index")
+
+        vectorstore = load_vectorstore(embeddings)
     else:
         print("Creating new index")
 
-        processed_documents = process_json_files(
-            "Data_preparation/enwikivoyage-sectioned"
-        )
+        vectorstore = build_index_streaming(embeddings)
 
-        chunks = create_chunks(processed_documents)
+    return vectorstore
 
-        vectorstore = FAISS.from_documents(
-            chunks,
-            embeddings
-        )
 
-        vectorstore.save_local("faiss_index")
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the FAISS index")
+    parser.add_argument("--update", action="store_true",
+                        help="Re-embed only new or changed articles of the existing index")
+    parser.add_argument("--compact", action="store_true",
+                        help="With --update, always compact deleted rows")
+    args = parser.parse_args()
 
-    return vectorstore
+    if args.update:
+        update_index(create_embeddings(), compact=args.compact)
+    else:
+        faiss_index()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Local trip / non_trip classifier in front of the LLM classifier.
+
+Every user message used to pay for a remote LLM round trip just to decide
+whether it is about travel. Three tiers now answer instead, cheapest first:
+
+    keyword     greetings and small talk -> non_trip; trip-planning words
+                ("flights", "hotel", "itinerary"), or a destination together
+                with a section intent ("eat in Rome") -> trip
+    embedding   logistic regression on the MiniLM embedding of the query,
+                trained on SEED_EXAMPLES when first used (a few ms)
+    llm         the original LLM prompt, only when the embedding model's
+                confidence is below INTENT_CONFIDENCE
+
+Words that are only travel-flavoured ("visit", "airport", "passport",
+"3 days in") are weak: they don't decide on their own, and when the
+embedding model calls such a query non_trip the two signals disagree, so
+the LLM decides.
+
+Measure how often each tier answers and how well it agrees with the LLM on
+the logged questions with:
+
+    python activity_planner/Intent_classifier.py
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple, TypedDict
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from Section_filter import keyword_intents
+
+LABELS = ("non_trip", "trip")
+# below this embedding-model probability the LLM decides
+INTENT_CONFIDENCE = float(os.getenv("INTENT_CONFIDENCE", "0.8"))
+# confidence reported for keyword decisions
+KEYWORD_CONFIDENCE = 0.95
+# confidence of a non_trip embedding decision on a query with a weak travel word;
+# below INTENT_CONFIDENCE, so the LLM settles the disagreement
+WEAK_KEYWORD_CONFIDENCE = 0.5
+LOG_FILE = Path(__file__).parent.parent / "qa_context_log.json"
+
+NON_TRIP_RE = re.compile(
+    r"^\W*(?:hi|hii+|hello|hey|hey there|yo|good (?:morning|afternoon|evening|night)|thanks?|thank you"
+    r"|thx|ok|okay|cool|great|bye|goodbye|see you|who are you|how are you|what(?:'s| is) up)\W*$",
+    re.IGNORECASE,
+)
+# trip-planning words, enough on their own
+TRIP_RE = re.compile(
+    r"\b(?:trips?|travel(?:l?ing)?|vacations?|holidays?|itinerar(?:y|ies)|flights?|flght|hotels?"
+    r"|hostels?|sightseeing|backpack(?:ing)?|honeymoon|getaway|cruise)\b",
+    re.IGNORECASE,
+)
+# travel-flavoured words that also appear in other questions ("how many days in a year",
+# "visit the doctor", "tours of duty", "passport photo size")
+WEAK_TRIP_RE = re.compile(
+    r"\b(?:destinations?|visit(?:ing)?|tour(?:s|ist|ism)?|weekend in|days? in|nights? in|abroad"
+    r"|passport|visas?|airport)\b",
+    re.IGNORECASE,
+)
+
+LLM_PROMPT = """You are a travel question classifier. Classify the user's question into one of two categories:
+
+1. "trip" - If the question is about travel planning, trips, destinations, accommodations, flights, activities, or any travel-related topic
+2. "non_trip" - If the question is a greeting, general knowledge question, or anything not related to travel
+
+Respond with ONLY the category name, nothing else."""
+
+# training set of the embedding tier
+SEED_EXAMPLES = {
+    "trip": [
+        "Plan a 5-day trip to Tokyo in April",
+        "plan trip to thailand",
+        "What are the best cultural spots in Rome?",
+        "Find a flight from my location to Paris and suggest some hotels",
+        "look for flights and hotels for next month",
+        "Where should I stay in Barcelona?",
+        "Is it safe to walk around Rio at night?",
+        "How do I get from the airport to the city centre?",
+        "Things to do in Lisbon with kids",
+        "Best street food in Bangkok",
+        "Do I need a visa for Vietnam?",
+        "Suggest a weekend getaway near Mumbai",
+        "How many days do I need in Iceland?",
+        "cheap places to eat in London",
+        "What's the best time of year to visit Bali?",
+        "Recommend an itinerary for two weeks in Japan",
+        "Which beaches are nice in Goa?",
+        "How expensive is a taxi in New York?",
+        "I want to go hiking in the Alps this summer",
+        "budget backpacking route through South America",
+        "what should I pack for a winter holiday in Finland",
+        "book a hotel near the Eiffel tower",
+        "Is tap water safe to drink in Mexico City?",
+        "which museums should I see in Amsterdam",
+        "road trip ideas along the California coast",
+        "how to get around Istanbul by public transport",
+        "nightlife in Berlin",
+        "romantic honeymoon destinations in Europe",
+    ],
+    "non_trip": [
+        "hi",
+        "hello there",
+        "how can you help me",
+        "what can you do?",
+        "who are you",
+        "thanks a lot",
+        "good morning",
+        "What is the capital of Australia?",
+        "Explain how neural networks work",
+        "Write a poem about the sea",
+        "What is 17 times 23?",
+        "Who won the football world cup in 2018?",
+        "Tell me a joke",
+        "How do I fix a Python import error?",
+        "what's the weather like on Mars",
+        "Translate 'good night' into Spanish",
+        "What is the meaning of life?",
+        "Recommend a good book to read",
+        "how do vaccines work",
+        "What's your name?",
+        "summarize the plot of Hamlet",
+        "help me write a cover letter",
+        "ok bye",
+        "can you speak French?",
+        "How many days in a leap year?",
+        "When should I visit a doctor about a cough?",
+    ],
+}
+
+
+class IntentResult(TypedDict):
+    question_type: str  # "trip" or "non_trip"
+    confidence: float
+    tier: str  # "keyword", "embedding" or "llm"
+    intents: List[str]  # section intents (Section_filter.INTENT_SECTIONS) found by keyword
+
+
+def train_logistic_regression(x: np.ndarray, y: np.ndarray, l2: float = 1e-3,
+                              steps: int = 1000, learning_rate: float = 1.0) -> Tuple[np.ndarray, float]:
+    """Full-batch gradient descent; the seed set is far too small to need more."""
+    weights = np.zeros(x.shape[1], dtype=np.float64)
+    bias = 0.0
+    for _ in range(steps):
+        p = 1 / (1 + np.exp(-(x @ weights + bias)))
+        error = p - y
+        weights -= learning_rate * (x.T @ error / len(y) + l2 * weights)
+        bias -= learning_rate * error.mean()
+    return weights, bias
+
+
+def llm_classify(query: str) -> str:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from Model import llm
+
+    response = llm.invoke([SystemMessage(content=LLM_PROMPT), HumanMessage(content=query)])
+    # qwen3 may prefix its answer with <think>...</think>
+    raw = re.sub(r"<think>.*?</think>", "", response.content, flags=re.DOTALL).strip().lower()
+    # empty output (a tool call) or anything unclear counts as non_trip
+    return "trip" if raw.startswith("trip") else "non_trip"
+
+
+class IntentClassifier:
+    """Keyword rules, then an embedding model, then the LLM for low-confidence queries."""
+
+    def __init__(self, embeddings, destination_index=None, threshold: float = INTENT_CONFIDENCE,
+                 use_llm: bool = True):
+        self.embeddings = embeddings
+        self.destination_index = destination_index
+        self.threshold = threshold
+        self.use_llm = use_llm
+        self._model = None
+
+    @property
+    def model(self) -> Tuple[np.ndarray, float]:
+        if self._model is None:
+            texts = [text for label in LABELS for text in SEED_EXAMPLES[label]]
+            y = np.array([LABELS.index(label) for label in LABELS for _ in SEED_EXAMPLES[label]], dtype=np.float64)
+            self._model = train_logistic_regression(self._features(self.embeddings.embed_documents(texts)), y)
+        return self._model
+
+    @staticmethod
+    def _features(vectors) -> np.ndarray:
+        x = np.asarray(vectors, dtype=np.float64)
+        if x.ndim == 1:
+            x = x[None, :]
+        return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+    def keyword(self, query: str, intents: Optional[List[str]] = None) -> Optional[str]:
+        if NON_TRIP_RE.match(query):
+            return "non_trip"
+        if TRIP_RE.search(query):
+            return "trip"
+        # a place name alone ("capital of Australia?") or an intent word alone
+        # ("how do vaccines work") is not enough; both together are
+        intents = keyword_intents(query) if intents is None else intents
+        if intents and self.destination_index is not None and self.destination_index.detect(query):
+            return "trip"
+        return None
+
+    def embedding(self, query: str, vector: Optional[np.ndarray] = None) -> Tuple[str, float]:
+        """Label and probability of the embedding model; `vector` reuses a query embedding."""
+        weights, bias = self.model
+        if vector is None:
+            vector = self.embeddings.embed_query(query)
+        p_trip = float(1 / (1 + np.exp(-(self._features(vector)[0] @ weights + bias))))
+        return ("trip", p_trip) if p_trip >= 0.5 else ("non_trip", 1 - p_trip)
+
+    def local(self, query: str, vector: Optional[np.ndarray] = None) -> IntentResult:
+        """Keyword or embedding decision, whatever its confidence."""
+        intents = keyword_intents(query)
+        label = self.keyword(query, intents)
+        if label is not None:
+            return {"question_type": label, "confidence": KEYWORD_CONFIDENCE, "tier": "keyword", "intents": intents}
+        label, confidence = self.embedding(query, vector)
+        if label == "non_trip" and WEAK_TRIP_RE.search(query):
+            confidence = min(confidence, WEAK_KEYWORD_CONFIDENCE)
+        return {"question_type": label, "confidence": confidence, "tier": "embedding", "intents": intents}
+
+    def classify(self, query: str, vector: Optional[np.ndarray] = None) -> IntentResult:
+        result = self.local(query, vector)
+        if result["confidence"] < self.threshold and self.use_llm:
+            result = {**result, "question_type": llm_classify(query), "tier": "llm"}
+        return result
+
+
+def load_logged_questions(path: Path = LOG_FILE) -> List[str]:
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        questions = [e["question"].strip() for e in json.load(f) if e.get("question", "").strip()]
+    return list(dict.fromkeys(questions))
+
+
+def agreement_report(classifier: IntentClassifier, questions: List[str], use_llm: bool = True,
+                     thresholds=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95)) -> dict:
+    """Local decisions vs the LLM per question, per tier and per confidence threshold."""
+    rows = []
+    for question in questions:
+        start = time.perf_counter()
+        local = classifier.local(question)
+        local_ms = (time.perf_counter() - start) * 1000
+        row = {"question": question, **local, "local_ms": local_ms}
+        if use_llm:
+            start = time.perf_counter()
+            row["llm"] = llm_classify(question)
+            row["llm_ms"] = (time.perf_counter() - start) * 1000
+        rows.append(row)
+
+    report = {"questions": len(rows), "mean_local_ms": float(np.mean([r["local_ms"] for r in rows])) if rows else 0.0}
+    for tier in ("keyword", "embedding"):
+        tier_rows = [r for r in rows if r["tier"] == tier]
+        report[f"{tier}_decisions"] = len(tier_rows)
+        if use_llm and tier_rows:
+            report[f"{tier}_agreement"] = float(np.mean([r["question_type"] == r["llm"] for r in tier_rows]))
+    if use_llm and rows:
+        report["mean_llm_ms"] = float(np.mean([r["llm_ms"] for r in rows]))
+        sweep = []
+        for threshold in thresholds:
+            local_rows = [r for r in rows if r["confidence"] >= threshold]
+            sweep.append({
+                "threshold": threshold,
+                "local_share": len(local_rows) / len(rows),
+                "local_agreement": float(np.mean([r["question_type"] == r["llm"] for r in local_rows]))
+                if local_rows else None,
+            })
+        report["thresholds"] = sweep
+    report["rows"] = rows
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local intent classifier vs the LLM on logged questions")
+    parser.add_argument("--log", default=str(LOG_FILE), help="QA log with the questions to classify")
+    parser.add_argument("--no-llm", action="store_true", help="Only show the local decisions")
+    parser.add_argument("--output", default=None, help="Path for the JSON report")
+    args = parser.parse_args()
+
+    from Embedding_backend import create_embeddings
+
+    questions = load_logged_questions(Path(args.log))
+    if not questions:
+        raise SystemExit(f"No questions in {args.log}")
+    # the report compares local() with the LLM itself; use_llm only matters for classify()
+    classifier = IntentClassifier(create_embeddings(), use_llm=not args.no_llm)
+    report = agreement_report(classifier, questions, use_llm=not args.no_llm)
+
+    for row in report["rows"]:
+        llm = f"  llm={row['llm']}" if "llm" in row else ""
+        print(f"{row['tier']:<10}{row['question_type']:<10}{row['confidence']:>6.2f}{llm}  {row['question']}")
+    print()
+    for key, value in report.items():
+        if key not in ("rows", "thresholds"):
+            print(f"{key:>22}: {value:.3f}" if isinstance(value, float) else f"{key:>22}: {value}")
+    for entry in report.get("thresholds", []):
+        agreement = "-" if entry["local_agreement"] is None else f"{entry['local_agreement']:.3f}"
+        print(f"  threshold {entry['threshold']:.2f}: {entry['local_share']:.0%} answered locally, "
+              f"agreement {agreement}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,292 @@
+"""
+Long-lived MCP sessions to SerpApi's MCP server.
+
+Every hotel search used to open a streamable HTTP connection, run the MCP
+initialize handshake and tear both down again, inside an event loop created
+for that one call. MCPSessionPool keeps up to MCP_POOL_SIZE initialized
+sessions open on a single background event loop instead:
+
+    - sessions are opened on first use and reused by later calls
+    - a call that fails on a broken connection closes that session and is
+      retried once on a freshly opened one, within the same deadline; errors
+      the server answers with are not retried
+    - every MCP_HEALTH_INTERVAL seconds idle sessions are pinged; a session
+      that doesn't answer is reopened before the next call needs it
+
+`call_tool` blocks the calling thread (tools run in worker threads) and
+`call_tool_async` can be awaited from any event loop; both run the request
+on the pool's loop.
+"""
+
 import asyncio
+import atexit
 import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import anyio
+import httpx
 from dotenv import load_dotenv
 from mcp import ClientSession
 from mcp.client.streamable_http import streamable_http_client
-from contextlib import asynccontextmanager
+# mcp 1.x: from 1.26 a restarted server ends the session with "Session terminated";
+# 2.x renamed McpError and reworked the client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
 
 load_dotenv()
 
 serpapi_key = os.getenv("SERP_API_KEY")
 
+MCP_URL = os.getenv("MCP_URL", f"https://mcp.serpapi.com/{serpapi_key}/mcp")
+# sessions kept open; calls beyond that wait for a free one
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+# seconds a call may take; kept below Agents.TOOL_TIMEOUT (30) so a call the agent has
+# given up on also releases its session and worker thread
+MCP_CALL_TIMEOUT = float(os.getenv("MCP_CALL_TIMEOUT", "25"))
+MCP_CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", "20"))
+# seconds between pings of idle sessions; 0 disables the health checks
+MCP_HEALTH_INTERVAL = float(os.getenv("MCP_HEALTH_INTERVAL", "60"))
+PING_TIMEOUT = 5
+# exceptions of a connection that broke under a request
+TRANSPORT_ERRORS = (ConnectionError, httpx.TransportError, anyio.ClosedResourceError,
+                    anyio.BrokenResourceError, anyio.EndOfStream)
+# the streamable HTTP client's error when the server no longer knows the session id
+# (restarted, or the session expired); its code is a positive 32600, not JSON-RPC's
+# INVALID_REQUEST (-32600), so it is matched together with its message
+SESSION_TERMINATED = (32600, "Session terminated")
+
+
+def session_broken(error: Exception) -> bool:
+    """True when `error` means the session is unusable, so the request may be retried on another."""
+    if isinstance(error, McpError):
+        code, message = error.error.code, error.error.message
+        return code == CONNECTION_CLOSED or (code, message) == SESSION_TERMINATED
+    return isinstance(error, TRANSPORT_ERRORS)
+
+
 @asynccontextmanager
-async def mcp_session():
-    async with streamable_http_client(
-        f"https://mcp.serpapi.com/{serpapi_key}/mcp"
-    ) as transport:
+async def mcp_session(url: str = MCP_URL):
+    async with streamable_http_client(url) as transport:
         read = transport[0]
         write = transport[1]
         async with ClientSession(read, write) as session:
             await session.initialize()
             yield session
 
+
+class MCPConnection:
+    """One initialized session, held open by a task that owns its transport."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session: Optional[ClientSession] = None
+        self.opened = False
+        self._task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def _hold(self, ready: asyncio.Future) -> None:
+        # the transport's task group must be entered and exited by the same task
+        try:
+            async with mcp_session(self.url) as session:
+                self.session = session
+                ready.set_result(None)
+                await self._closing.wait()
+        except Exception as e:
+            # anyio wraps transport errors (e.g. connection refused) in exception groups
+            while len(getattr(e, "exceptions", ())) == 1:
+                e = e.exceptions[0]
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"[MCP] session lost: {type(e).__name__}: {e}")
+        finally:
+            self.session = None
+
+    async def open(self, timeout: float = MCP_CONNECT_TIMEOUT) -> None:
+        ready = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._task = asyncio.create_task(self._hold(ready))
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except BaseException:
+            self._task.cancel()
+            raise
+        self.opened = True
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(self._task, PING_TIMEOUT)
+        except BaseException:
+            self._task.cancel()
+        self._task = None
+        self.session = None
+
+
+class MCPSessionPool:
+    """Pooled MCP sessions on a dedicated event loop, with sync and async call APIs."""
+
+    def __init__(self, url: str = MCP_URL, size: int = MCP_POOL_SIZE, timeout: float = MCP_CALL_TIMEOUT,
+                 health_interval: float = MCP_HEALTH_INTERVAL):
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._connections = []
+        self._health_task = None
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "connects": 0, "reconnects": 0, "retries": 0,
+                         "timeouts": 0, "health_checks": 0, "health_failures": 0}
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="mcp-pool", daemon=True)
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                self._loop = loop
+                atexit.register(self.close)
+            return self._loop
+
+    async def _setup(self) -> None:
+        self._idle = asyncio.Queue()
+        self._connections = [MCPConnection(self.url) for _ in range(self.size)]
+        for connection in self._connections:
+            self._idle.put_nowait(connection)
+        if self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _connect(self, connection: MCPConnection) -> ClientSession:
+        if not connection.alive:
+            if connection.opened:
+                self.counters["reconnects"] += 1
+            await connection.close()
+            await connection.open()
+            self.counters["connects"] += 1
+        return connection.session
+
+    async def _request(self, request: Callable[[ClientSession], Awaitable[Any]], timeout: float) -> Any:
+        # one deadline for the whole call: waiting for a session, connecting and both attempts
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            connection = await asyncio.wait_for(self._idle.get(), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise
+        try:
+            for attempt in (0, 1):
+                try:
+                    session = await asyncio.wait_for(self._connect(connection), max(0.0, deadline - loop.time()))
+                    return await asyncio.wait_for(request(session), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    # the session may still deliver the late response; don't reuse it
+                    self.counters["timeouts"] += 1
+                    await connection.close()
+                    raise
+                except Exception as e:
+                    if not session_broken(e):
+                        raise  # the server answered with an error; the session is fine
+                    await connection.close()
+                    if attempt:
+                        raise
+                    self.counters["retries"] += 1
+                    print(f"[MCP] request failed ({type(e).__name__}: {e}), retrying on a new session")
+        finally:
+            self._idle.put_nowait(connection)
+
+    async def _check(self, connection: MCPConnection) -> None:
+        try:
+            if not connection.opened:
+                return  # never used; opened by the first call that needs it
+            self.counters["health_checks"] += 1
+            try:
+                if not connection.alive:
+                    raise ConnectionError("session closed")
+                await asyncio.wait_for(connection.session.send_ping(), PING_TIMEOUT)
+            except Exception as e:
+                self.counters["health_failures"] += 1
+                print(f"[MCP] health check failed ({e!r}), reconnecting")
+                await connection.close()
+                try:
+                    await self._connect(connection)
+                except Exception as e:
+                    # left closed; the next call tries again
+                    print(f"[MCP] reconnect failed: {type(e).__name__}: {e}")
+        finally:
+            self._idle.put_nowait(connection)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            # only idle sessions, checked together so one hanging ping doesn't hold up the rest;
+            # busy sessions prove their health by answering
+            idle = [self._idle.get_nowait() for _ in range(self._idle.qsize())]
+            await asyncio.gather(*(self._check(connection) for connection in idle))
+
+    def _submit(self, request: Callable[[ClientSession], Awaitable[Any]], timeout: Optional[float]):
+        loop = self._start()
+        with self._lock:
+            self.counters["calls"] += 1
+        return asyncio.run_coroutine_threadsafe(self._request(request, timeout or self.timeout), loop)
+
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None):
+        """Content of the tool result; blocks the calling thread."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("call_tool would block the MCP pool's own loop; use call_tool_async")
+        future = self._submit(lambda session: session.call_tool(tool_name, arguments), timeout)
+        return future.result().content
+
+    async def call_tool_async(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None):
+        future = self._submit(lambda session: session.call_tool(tool_name, arguments), timeout)
+        return (await asyncio.wrap_future(future)).content
+
+    async def list_tools_async(self, timeout: Optional[float] = None):
+        future = self._submit(lambda session: session.list_tools(), timeout)
+        return (await asyncio.wrap_future(future)).tools
+
+    async def _shutdown(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+        await asyncio.gather(*(connection.close() for connection in self._connections), return_exceptions=True)
+
+    def close(self) -> None:
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(PING_TIMEOUT * 2)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(PING_TIMEOUT)
+            loop.close()
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self.counters)
+        stats["open_sessions"] = sum(connection.alive for connection in self._connections)
+        return stats
+
+
+# shared by all tool calls of the process; nothing connects until the first call
+mcp_pool = MCPSessionPool()
+
+
 async def call_mcp_tool(tool_name: str, arguments: dict):
-    async with mcp_session() as session:
-        result = await session.call_tool(tool_name, arguments)
-        return result.content
+    return await mcp_pool.call_tool_async(tool_name, arguments)
+
 
 async def list_mcp_tools():
-    async with mcp_session() as session:
-        tools = await session.list_tools()
-        return tools.tools
\ No newline at end of file
+    return await mcp_pool.list_tools_async()
@@ -0,0 +1,227 @@
+"""
+Two-level cache of retrieval results, shared by all requests of a process.
+
+    exact      LRU keyed by the normalized query ("Things to do in Paris?"
+               and "things to do in paris" share an entry); a hit skips
+               embedding, search and reranking
+    semantic   the query embedding is compared with the embeddings of the
+               cached queries; a cosine similarity of at least
+               QUERY_CACHE_SIMILARITY reuses that result, skipping search
+               and reranking. Off unless QUERY_CACHE_SEMANTIC=1: questions
+               that differ in one word ("cheap hotels in Rome" / "luxury
+               hotels in Rome") can embed very close together, so check the
+               threshold on your model with `python activity_planner/Query_cache.py`
+               before enabling it
+
+Both levels only match entries of the same scope (destinations and
+sections searched, k and rerank depth), so "things to do in Paris" never answers for Rome
+however close the two embeddings are. Entries expire after
+QUERY_CACHE_TTL seconds, the least recently used entry is evicted beyond
+QUERY_CACHE_SIZE entries, and the whole cache is dropped when it is used
+with a different index version than the one it was filled from.
+
+The version is read from the index file on every search. A running process
+keeps serving the index it loaded after a rebuild or update, but its cached
+results are dropped as soon as the new index is published, and no new ones
+are cached until the process is restarted on the new index.
+"""
+
+import argparse
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+# entries kept; 0 disables the cache
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+# semantic level (similar questions share a result); exact hits only by default
+QUERY_CACHE_SEMANTIC = os.getenv("QUERY_CACHE_SEMANTIC", "0") == "1"
+# minimum cosine similarity for a semantic hit; calibrate with main() below
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.95"))
+
+# (question, question, same answer?) pairs for calibrating QUERY_CACHE_SIMILARITY
+CALIBRATION_PAIRS = [
+    ("Things to do in Paris", "What can I do in Paris?", True),
+    ("Best places to eat in Rome", "Where should I eat in Rome?", True),
+    ("How do I get from the airport to the city centre in Lisbon?",
+     "Lisbon airport to city centre transport", True),
+    ("Is Bangkok safe at night?", "Is it safe to walk around Bangkok at night?", True),
+    ("Cheap hotels in Barcelona", "Budget accommodation in Barcelona", True),
+    ("What to see in Kyoto in two days", "Two day Kyoto sightseeing itinerary", True),
+    ("Cheap hotels in Rome", "Luxury hotels in Rome", False),
+    ("Things to do in Paris in winter", "Things to do in Paris in summer", False),
+    ("Best bars in Berlin", "Best museums in Berlin", False),
+    ("Is tap water safe to drink in Mexico City?", "Is street food safe to eat in Mexico City?", False),
+    ("How to get to Venice by train", "How to get to Venice by plane", False),
+    ("Family friendly beaches in Bali", "Nude beaches in Bali", False),
+    ("Where to stay in Tokyo", "Where to eat in Tokyo", False),
+]
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(WORD_RE.findall(query.lower()))
+
+
+class CacheEntry:
+    __slots__ = ("result", "scope", "slot", "created")
+
+    def __init__(self, result: dict, scope: Hashable, slot: int, created: float):
+        self.result = result
+        self.scope = scope
+        self.slot = slot
+        self.created = created
+
+
+class QueryCache:
+    """Exact-match LRU plus cosine-similarity lookup over the same entries."""
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL,
+                 similarity: float = QUERY_CACHE_SIMILARITY, semantic: bool = QUERY_CACHE_SEMANTIC):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.semantic = semantic
+        self.version = None
+        self._entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        # unit query vectors by slot; slots are reused after eviction
+        self._vectors: Optional[np.ndarray] = None
+        self._reset()
+        self._lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0,
+                         "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _reset(self) -> None:
+        self._entries.clear()
+        self._slot_keys = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _validate(self, version: Hashable) -> None:
+        if version != self.version:
+            if self._entries:
+                self.counters["invalidations"] += 1
+            self._reset()
+            self.version = version
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key)
+        self._slot_keys[entry.slot] = None
+        self._free_slots.append(entry.slot)
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.created > self.ttl
+
+    def get(self, query: str, scope: Hashable, version: Hashable) -> Optional[dict]:
+        """Exact lookup of the normalized query (a miss is counted by `get_similar`)."""
+        key = (normalize_query(query), scope)
+        with self._lock:
+            self._validate(version)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, time.monotonic()):
+                self._remove(key)
+                self.counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.counters["exact_hits"] += 1
+            return entry.result
+
+    def get_similar(self, vector: np.ndarray, scope: Hashable, version: Hashable) -> Optional[dict]:
+        """Result of the most similar cached query of the same scope, if similar enough."""
+        with self._lock:
+            self._validate(version)
+            if not self.semantic or self._vectors is None or not self._entries:
+                self.counters["misses"] += 1
+                return None
+            now = time.monotonic()
+            for key in [k for k, e in self._entries.items() if self._expired(e, now)]:
+                self._remove(key)
+                self.counters["expirations"] += 1
+
+            slots = np.array([e.slot for e in self._entries.values() if e.scope == scope], dtype=np.int64)
+            if len(slots):
+                query = np.asarray(vector, dtype=np.float32)
+                query = query / (np.linalg.norm(query) or 1.0)
+                similarities = self._vectors[slots] @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity:
+                    key = self._slot_keys[slots[best]]
+                    self._entries.move_to_end(key)
+                    self.counters["semantic_hits"] += 1
+                    return self._entries[key].result
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, query: str, vector: np.ndarray, scope: Hashable, version: Hashable,
+            result: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        key = (normalize_query(query), scope)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._validate(version)
+            if key in self._entries:
+                self._remove(key)
+            if not self._free_slots:
+                self._remove(next(iter(self._entries)))  # least recently used
+                self.counters["evictions"] += 1
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector / (np.linalg.norm(vector) or 1.0)
+            self._slot_keys[slot] = key
+            self._entries[key] = CacheEntry(result, scope, slot, time.monotonic())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+def calibrate(embeddings, pairs=CALIBRATION_PAIRS) -> dict:
+    """Cosine similarity of each pair, and the thresholds that keep different questions apart."""
+    firsts = np.asarray(embeddings.embed_documents([a for a, _, _ in pairs]), dtype=np.float32)
+    seconds = np.asarray(embeddings.embed_documents([b for _, b, _ in pairs]), dtype=np.float32)
+    cosine = (firsts * seconds).sum(axis=1) / (np.linalg.norm(firsts, axis=1) * np.linalg.norm(seconds, axis=1))
+    same = np.array([s for _, _, s in pairs])
+    return {
+        "pairs": [(a, b, s, float(c)) for (a, b, s), c in zip(pairs, cosine)],
+        "min_same": float(cosine[same].min()),
+        "max_different": float(cosine[~same].max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure query similarities for QUERY_CACHE_SIMILARITY")
+    parser.add_argument("--threshold", type=float, default=QUERY_CACHE_SIMILARITY)
+    args = parser.parse_args()
+
+    from Embedding_backend import create_embeddings
+
+    report = calibrate(create_embeddings())
+    for a, b, same, cosine in report["pairs"]:
+        hit = "hit " if cosine >= args.threshold else "miss"
+        print(f"{cosine:.3f} {hit} {'same' if same else 'diff'}  {a!r} / {b!r}")
+    print(f"lowest same-question similarity:      {report['min_same']:.3f}")
+    print(f"highest different-question similarity: {report['max_different']:.3f}")
+    if report["max_different"] >= args.threshold:
+        print(f"threshold {args.threshold} would answer a different question; raise it or keep "
+              f"QUERY_CACHE_SEMANTIC off")
+
+
+if __name__ == "__main__":
+    main()
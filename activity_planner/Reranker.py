@@ -0,0 +1,167 @@
+"""
+Cross-encoder reranking service shared by all requests of a process.
+
+The (query, passage) pairs of concurrent requests are pooled by a
+MicroBatcher and scored in one forward pass instead of one small pass per
+request. The model is loaded on first use rather than at import, and can run
+on PyTorch, ONNX Runtime or an int8-quantized ONNX export
+(RERANKER_BACKEND). The quantized export is created once under
+RERANKER_ONNX_DIR.
+
+Compare latency and ranking agreement of a backend against PyTorch with:
+
+    python activity_planner/Reranker.py --backend onnx_int8 --candidates 50 --concurrency 8
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from Embedding_backend import PARITY_SAMPLE_TEXTS, MicroBatcher, load_sample_chunks
+
+RERANKER_MODEL = "BAAI/bge-reranker-base"
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")
+BACKENDS = ("torch", "onnx", "onnx_int8")
+# local copy of the model holding the int8 export
+RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", "reranker_onnx")
+RERANKER_INT8_CONFIG = os.getenv("RERANKER_INT8_CONFIG", "avx2")  # avx2, avx512, avx512_vnni, arm64
+# passages are truncated to this many tokens; chunks are ~1000 characters
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "64"))
+
+# pairs from concurrent requests are pooled for at most this long
+RERANK_WAIT_MS = float(os.getenv("RERANKER_WAIT_MS", "3"))
+# requests (not pairs) scored together in one pooled call
+RERANK_MAX_REQUESTS = int(os.getenv("RERANKER_MAX_REQUESTS", "16"))
+
+Pair = Tuple[str, str]
+
+
+def load_cross_encoder(backend: str = RERANKER_BACKEND, model_name: str = RERANKER_MODEL):
+    from sentence_transformers import CrossEncoder
+
+    if backend == "torch":
+        return CrossEncoder(model_name, max_length=RERANKER_MAX_LENGTH)
+    if backend == "onnx":
+        return CrossEncoder(model_name, max_length=RERANKER_MAX_LENGTH, backend="onnx")
+    if backend != "onnx_int8":
+        raise ValueError(f"Unknown reranker backend {backend!r}. Available: {list(BACKENDS)}")
+
+    file_name = f"onnx/model_qint8_{RERANKER_INT8_CONFIG}.onnx"
+    if not os.path.exists(os.path.join(RERANKER_ONNX_DIR, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        print(f"Exporting int8 ONNX reranker to {RERANKER_ONNX_DIR}")
+        model = CrossEncoder(model_name, max_length=RERANKER_MAX_LENGTH, backend="onnx")
+        model.save_pretrained(RERANKER_ONNX_DIR)
+        export_dynamic_quantized_onnx_model(model, RERANKER_INT8_CONFIG, RERANKER_ONNX_DIR)
+    return CrossEncoder(RERANKER_ONNX_DIR, max_length=RERANKER_MAX_LENGTH, backend="onnx",
+                        model_kwargs={"file_name": file_name})
+
+
+class RerankerService:
+    """Lazily loaded cross-encoder whose `score` calls are micro-batched across threads."""
+
+    def __init__(self, backend: str = RERANKER_BACKEND, model_name: str = RERANKER_MODEL,
+                 max_wait_ms: float = RERANK_WAIT_MS, max_requests: int = RERANK_MAX_REQUESTS):
+        self.backend = backend
+        self.model_name = model_name
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.batcher = MicroBatcher(self._score_requests, max_requests, max_wait_ms)
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = load_cross_encoder(self.backend, self.model_name)
+        return self._model
+
+    def predict(self, pairs: List[Pair]) -> np.ndarray:
+        scores = np.asarray(self.model.predict(pairs, batch_size=RERANKER_BATCH_SIZE,
+                                               show_progress_bar=False))
+        if scores.ndim == 2:  # two-logit models: probability of "relevant"
+            scores = scores[:, 1]
+        return scores
+
+    def _score_requests(self, requests: List[List[Pair]]) -> List[List[float]]:
+        pairs = [pair for request in requests for pair in request]
+        scores = self.predict(pairs).tolist() if pairs else []
+        results = []
+        start = 0
+        for request in requests:
+            results.append(scores[start:start + len(request)])
+            start += len(request)
+        return results
+
+    def score(self, pairs: List[Pair]) -> List[float]:
+        """Relevance score per (query, passage) pair; same interface as HuggingFaceCrossEncoder."""
+        if not pairs:
+            return []
+        return self.batcher.submit(list(pairs))
+
+
+def benchmark(backend: str, queries: List[str], passages: List[str], candidates: int,
+              concurrency: int, top_n: int = 3, reference: Optional[RerankerService] = None) -> dict:
+    """p50/p95 request latency for `concurrency` parallel requests, plus top-n agreement with `reference`."""
+    service = RerankerService(backend)
+    service.score([(queries[0], passages[0])])  # warm-up: model load / export
+
+    rng = np.random.default_rng(0)
+    requests = [(q, [passages[i] for i in rng.choice(len(passages), candidates, replace=False)])
+                for q in queries]
+
+    def run(request):
+        query, texts = request
+        start = time.perf_counter()
+        scores = service.score([(query, text) for text in texts])
+        return (time.perf_counter() - start) * 1000, list(np.argsort(scores)[::-1][:top_n])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, requests))
+    latencies = np.array([latency for latency, _ in results])
+    report = {
+        "backend": backend,
+        "candidates": candidates,
+        "concurrency": concurrency,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+    if reference is not None:
+        overlap = []
+        for (query, texts), (_, top) in zip(requests, results):
+            ref_scores = reference.predict([(query, text) for text in texts])
+            overlap.append(len(set(top) & set(np.argsort(ref_scores)[::-1][:top_n])) / top_n)
+        report[f"top{top_n}_agreement"] = float(np.mean(overlap))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reranker latency and agreement with PyTorch")
+    parser.add_argument("--backend", choices=BACKENDS, default="onnx_int8")
+    parser.add_argument("--candidates", type=int, default=50, help="Passages reranked per request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel requests")
+    parser.add_argument("--requests", type=int, default=64)
+    args = parser.parse_args()
+
+    passages = load_sample_chunks("faiss_index", max(args.candidates * 4, 200))
+    if len(passages) < args.candidates:
+        raise SystemExit("Build the index first: not enough chunks in faiss_index/chunks")
+    questions = [text for text in PARITY_SAMPLE_TEXTS if text.endswith("?")]
+    queries = [questions[i % len(questions)] for i in range(args.requests)]
+
+    reference = RerankerService("torch") if args.backend != "torch" else None
+    for backend in ("torch", args.backend) if reference else ("torch",):
+        report = benchmark(backend, queries, passages, args.candidates, args.concurrency,
+                           reference=reference if backend != "torch" else None)
+        print("  ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Long-lived retrieval engine used by the agent's RAG node.
+
+Built once per agent: embeds the query, searches the FAISS index directly
+and, when a BM25 index is available, fuses its hits with the dense ones by
+reciprocal rank. When the query names a destination, both searches are
+limited to that article's chunks, and when its intent is clear (food,
+sights, transport...) to the matching WikiVoyage sections. The fused candidates are reranked with
+the cross-encoder and formatted into context and citations, timing each
+stage. Results are cached per query (exactly and by embedding similarity)
+when a QueryCache is given. This skips the langchain retriever and compression wrappers that
+were previously rebuilt on every request.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional, TypedDict
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from Section_filter import intent_sections, keyword_intents
+
+# ANN candidates per query, reranked down to RERANK_TOP_N. With the batched
+# int8 reranker a pool of ~50 fits the latency budget of 4 on PyTorch.
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+# fuse BM25 hits with the dense ones (needs faiss_index/sparse, built with the index)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+# standard RRF damping constant; larger values flatten the rank contributions
+RRF_K = int(os.getenv("RRF_K", "60"))
+# search only the chunks of the destination named in the query, if any
+DESTINATION_FILTER = os.getenv("DESTINATION_FILTER", "1") == "1"
+# search only the sections matching the query's intent (needs section-aware chunks)
+SECTION_FILTER = os.getenv("SECTION_FILTER", "1") == "1"
+# scoped searches over at most this many rows score every row exactly;
+# larger scopes (a section over the whole corpus) use filtered ANN search
+EXACT_SEARCH_MAX_ROWS = 4096
+
+
+class RetrievalResult(TypedDict):
+    documents: List[Document]
+    destinations: List[str]  # titles the search was limited to; empty for a global search
+    sections: List[str]  # sections the search was limited to; empty for all sections
+    context: str
+    citation: str  # JSON list of {"source", "seq_num"}
+    content: str  # JSON list of {"context"}
+    timings: Dict[str, float]  # milliseconds per stage
+    cached: str  # "exact" or "semantic" for a cache hit, "" otherwise
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = RRF_K) -> List[int]:
+    """Merge ranked id lists; ties keep the order of the earlier lists."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class RetrievalEngine:
+    """Query -> top documents over a FAISS vector store, with optional BM25 fusion and reranker."""
+
+    def __init__(self, vectorstore, cross_encoder=None, sparse_index=None, destination_index=None,
+                 section_index=None, cache=None, index_version=None, k: int = RETRIEVAL_K,
+                 rerank_top_n: int = RERANK_TOP_N):
+        self.vectorstore = vectorstore
+        self.index = vectorstore.index
+        self.docstore = vectorstore.docstore
+        self.index_to_docstore_id = vectorstore.index_to_docstore_id
+        self.embeddings = vectorstore.embedding_function
+        self.normalize = getattr(vectorstore, "_normalize_L2", False)
+        self.cross_encoder = cross_encoder
+        self.sparse_index = sparse_index
+        self.destination_index = destination_index
+        # indexes built with the recursive chunker have no sections to filter on
+        self.section_index = section_index if section_index is not None and section_index.available() else None
+        self.cache = cache
+        # `index_version()` is re-read on every search: cached results are only
+        # reused for the index version they came from, so publishing an update
+        # drops them even though this process keeps the index it loaded
+        self.index_version = index_version
+        self.loaded_version = index_version() if index_version is not None else None
+        self.k = k
+        self.rerank_top_n = rerank_top_n
+
+    def embed(self, query: str) -> np.ndarray:
+        vector = np.asarray([self.embeddings.embed_query(query)], dtype="float32")
+        if self.normalize:
+            faiss.normalize_L2(vector)
+        return vector
+
+    def ann_search(self, vector: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[int]:
+        if rows is not None:
+            return self.scoped_search(vector, k, rows)
+        _, ids = self.index.search(vector, k)
+        return [int(i) for i in ids[0] if i != -1]  # -1: fewer than k vectors in the index
+
+    def _selector_params(self, rows: np.ndarray, exhaustive: bool):
+        selector = faiss.IDSelectorBatch(rows)
+        base = self.index
+        if isinstance(base, faiss.IndexIDMap):
+            base = faiss.downcast_index(base.index)
+        if isinstance(base, faiss.IndexIVF):
+            # a small scope may sit in lists a normal probe never visits
+            return faiss.SearchParametersIVF(sel=selector, nprobe=base.nlist if exhaustive else base.nprobe)
+        if isinstance(base, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+        return faiss.SearchParameters(sel=selector)
+
+    def scoped_search(self, vector: np.ndarray, k: int, rows: np.ndarray) -> List[int]:
+        """Search over `rows` only; exact for small scopes."""
+        small = len(rows) <= EXACT_SEARCH_MAX_ROWS
+        vectors = None
+        if small:
+            try:
+                # a destination is tens of chunks: scoring them directly beats any ANN probe
+                vectors = self.index.reconstruct_batch(rows)
+            except RuntimeError:
+                pass  # IVF indexes without a direct map can't reconstruct
+        if vectors is None:
+            # only compute distances for the selected ids
+            _, ids = self.index.search(vector, k, params=self._selector_params(rows, exhaustive=small))
+            return [int(i) for i in ids[0] if i != -1]
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            distances = -(vectors @ vector[0])
+        else:
+            distances = ((vectors - vector[0]) ** 2).sum(axis=1)
+        top = np.argsort(distances, kind="stable")[:k]
+        return rows[top].tolist()
+
+    def sparse_search(self, query: str, k: int, rows: Optional[np.ndarray] = None) -> List[int]:
+        rows, _ = self.sparse_index.search(query, k, allowed_rows=rows)
+        return rows.tolist()
+
+    def fetch(self, ids: List[int]) -> List[Document]:
+        documents = []
+        for i in ids:
+            document = self.docstore.search(self.index_to_docstore_id[i])
+            if isinstance(document, Document):
+                documents.append(document)
+        return documents
+
+    def rerank(self, query: str, documents: List[Document], top_n: int) -> List[Document]:
+        if self.cross_encoder is None or len(documents) <= 1:
+            return documents[:top_n]
+        scores = self.cross_encoder.score([(query, d.page_content) for d in documents])
+        ranked = sorted(zip(documents, scores), key=lambda pair: pair[1], reverse=True)
+        return [document for document, _ in ranked[:top_n]]
+
+    @staticmethod
+    def format(documents: List[Document]) -> Dict[str, str]:
+        citations = []
+        contents = []
+        for document in documents:
+            citation = {
+                "source": document.metadata.get("source", "Unknown"),
+                "seq_num": document.metadata.get("seq_num", "Unknown")
+            }
+            content = {"context": document.page_content}
+            if content not in contents:  # avoid duplicates
+                contents.append(content)
+            if citation not in citations:
+                citations.append(citation)
+        return {
+            "context": "\n".join(d.page_content for d in documents),
+            "citation": json.dumps(citations),
+            "content": json.dumps(contents),
+        }
+
+    def scope(self, query: str, intents: Optional[List[str]] = None):
+        """Destinations, sections and rows a query is limited to (rows None: whole corpus)."""
+        destinations, sections, rows = [], [], None
+        if self.destination_index is not None:
+            destinations = self.destination_index.detect(query)
+            rows = self.destination_index.rows(destinations) if destinations else None
+            if rows is not None and not len(rows):
+                destinations, rows = [], None
+        if self.section_index is not None:
+            sections = intent_sections(keyword_intents(query) if intents is None else intents)
+            section_rows = self.section_index.rows(sections, within=rows) if sections else None
+            if section_rows is not None and len(section_rows):
+                rows = section_rows
+            else:
+                sections = []  # e.g. the destination has no such section
+        return destinations, sections, rows
+
+    def search(self, query: str, k: Optional[int] = None, rerank_top_n: Optional[int] = None,
+               intents: Optional[List[str]] = None, vector: Optional[np.ndarray] = None) -> RetrievalResult:
+        """`intents` (see Section_filter.INTENT_SECTIONS) overrides keyword intent detection;
+        `vector` reuses a query embedding from `embed()`."""
+        k = k or self.k
+        rerank_top_n = rerank_top_n or self.rerank_top_n
+        timings = {}
+
+        start = time.perf_counter()
+        destinations, sections, rows = self.scope(query, intents)
+        timings["scope_ms"] = (time.perf_counter() - start) * 1000
+
+        scope = (tuple(destinations), tuple(sections), k, rerank_top_n)
+        version = self.index_version() if self.index_version is not None else None
+        if self.cache is not None:
+            cached = self.cache.get(query, scope, version)
+            if cached is not None:
+                return self._cached(cached, "exact", timings, start)
+
+        if vector is None:
+            stage = time.perf_counter()
+            vector = self.embed(query)
+            timings["embed_ms"] = (time.perf_counter() - stage) * 1000
+
+        if self.cache is not None:
+            cached = self.cache.get_similar(vector[0], scope, version)
+            if cached is not None:
+                return self._cached(cached, "semantic", timings, start)
+
+        stage = time.perf_counter()
+        ids = self.ann_search(vector, k, rows)
+        timings["search_ms"] = (time.perf_counter() - stage) * 1000
+
+        if self.sparse_index is not None:
+            # sparse rows are chunk-store rows, the same id space as the faiss index
+            stage = time.perf_counter()
+            ids = reciprocal_rank_fusion([ids, self.sparse_search(query, k, rows)])[:k]
+            timings["sparse_ms"] = (time.perf_counter() - stage) * 1000
+
+        stage = time.perf_counter()
+        candidates = self.fetch(ids)
+        timings["fetch_ms"] = (time.perf_counter() - stage) * 1000
+
+        stage = time.perf_counter()
+        documents = self.rerank(query, candidates, rerank_top_n)
+        timings["rerank_ms"] = (time.perf_counter() - stage) * 1000
+
+        stage = time.perf_counter()
+        formatted = self.format(documents)
+        timings["format_ms"] = (time.perf_counter() - stage) * 1000
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+
+        result = {"documents": documents, "destinations": destinations, "sections": sections, **formatted}
+        # results of a superseded index are not cached under the new version
+        if self.cache is not None and version == self.loaded_version:
+            self.cache.put(query, vector[0], scope, version, result)
+        return {**result, "timings": timings, "cached": ""}
+
+    @staticmethod
+    def _cached(result: dict, level: str, timings: Dict[str, float], start: float) -> RetrievalResult:
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        return {**result, "timings": timings, "cached": level}
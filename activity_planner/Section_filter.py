@@ -0,0 +1,115 @@
+"""
+Intent -> WikiVoyage section mapping for section-filtered retrieval.
+
+Chunks record the section they come from (`section` metadata, written by
+the section-aware chunker). A question with a clear intent only needs the
+matching sections: "where to eat in Rome" is answered from the eat/drink
+chunks of Rome, not from its history or transport paragraphs. Restricting
+the search to those rows shrinks the ANN and rerank candidate sets and
+keeps unrelated context out of the prompt.
+
+Intents are detected from keywords here; questions without a clear intent
+(trip plans, overviews) are searched across all sections.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from Chunk_store import ChunkStore
+
+# intent -> sections searched for it (fields of Data_loading.SECTION_HEADINGS)
+INTENT_SECTIONS = {
+    "food": ("eat", "drink"),
+    "nightlife": ("drink",),
+    "sights": ("see", "do"),
+    "activities": ("do", "see"),
+    "shopping": ("buy",),
+    "accommodation": ("sleep",),
+    "arrival": ("get_in",),
+    "transport": ("get_around", "get_in"),
+    "safety": ("stay_safe", "stay_healthy"),
+    "culture": ("respect", "understand"),
+    "day_trips": ("go_next",),
+}
+
+INTENT_KEYWORDS = {
+    "food": r"eat|eating|food|foods|restaurants?|cuisine|dish(?:es)?|dinner|lunch|breakfast|brunch"
+            r"|cafes?|street food|vegetarian|vegan",
+    "nightlife": r"drinks?|bars?|pubs?|nightlife|night ?clubs?|clubbing|beers?|wine|cocktails?",
+    "sights": r"see|sights?|sightseeing|attractions?|museums?|landmarks?|monuments?|temples?"
+              r"|churches|cathedrals?|galleries|things to do|must visit",
+    "activities": r"activities|hik(?:e|es|ing)|beach(?:es)?|tours?|div(?:e|ing)|snorkel(?:ing)?"
+                  r"|ski(?:ing)?|surf(?:ing)?|trek(?:king)?",
+    "shopping": r"shop|shops|shopping|markets?|souvenirs?|malls?|bazaars?",
+    "accommodation": r"hotels?|hostels?|accommodations?|lodging|guest ?houses?|where to (?:stay|sleep)"
+                     r"|place to stay|places to stay|airbnb|resorts?",
+    "arrival": r"get (?:to|there)|getting (?:to|there)|fly(?:ing)? (?:to|into)|airports?|visas?|arriv(?:e|al)",
+    "transport": r"get(?:ting)? around|metro|subway|buses|bus|taxis?|public transport|trams?|car rental"
+                 r"|rent a car|trains?",
+    "safety": r"safe|safety|dangerous|crime|scams?|pickpockets?|health|vaccin(?:e|es|ations?)"
+              r"|tap water|hospitals?",
+    "culture": r"etiquette|customs|culture|tipping|dress code|respect|taboos?|religion",
+    "day_trips": r"day trips?|nearby|excursions?|go next|around the region",
+}
+INTENT_PATTERNS = {intent: re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE)
+                   for intent, pattern in INTENT_KEYWORDS.items()}
+
+# section sets kept resolved to rows by SectionIndex
+SECTION_ROWS_CACHE_SIZE = 32
+
+
+def keyword_intents(query: str) -> List[str]:
+    """Intents whose keywords occur in `query`, in INTENT_SECTIONS order."""
+    return [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(query)]
+
+
+def intent_sections(intents: Iterable[str]) -> List[str]:
+    sections = []
+    for intent in intents:
+        for section in INTENT_SECTIONS.get(intent, ()):
+            if section not in sections:
+                sections.append(section)
+    return sections
+
+
+class SectionIndex:
+    """Chunk-store rows by section, read from the store's `section` column."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        self.column = store.columns.get("section")
+        self.codes: Dict[str, int] = {}
+        if self.column is not None:
+            for code in np.unique(np.asarray(self.column)).tolist():
+                if code >= 0:
+                    self.codes[store.value(code)] = code
+        self._rows: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return bool(self.codes)
+
+    def _all_rows(self, sections: tuple) -> np.ndarray:
+        with self._lock:
+            rows = self._rows.get(sections)
+            if rows is not None:
+                self._rows.move_to_end(sections)
+                return rows
+        codes = [self.codes[s] for s in sections if s in self.codes]
+        rows = np.flatnonzero(np.isin(np.asarray(self.column), codes)).astype(np.int64)
+        with self._lock:
+            self._rows[sections] = rows
+            if len(self._rows) > SECTION_ROWS_CACHE_SIZE:
+                self._rows.popitem(last=False)
+        return rows
+
+    def rows(self, sections: List[str], within: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows of the given sections, optionally only among `within`."""
+        if within is not None:
+            codes = [self.codes[s] for s in sections if s in self.codes]
+            return within[np.isin(np.asarray(self.column)[within], codes)]
+        return self._all_rows(tuple(sorted(sections)))
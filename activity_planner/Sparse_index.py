@@ -0,0 +1,157 @@
+"""
+BM25 inverted index over the chunk store, used next to the dense FAISS index.
+
+Dense retrieval misses exact place names, airport codes and other proper
+nouns; a sparse lookup catches them in well under a millisecond. The index
+is built from the same chunks (and row numbers) as the FAISS index, so
+sparse hits and dense hits can be fused by row.
+
+Layout of a sparse index directory (all arrays memory-mapped on load):
+    terms.npy      uint64[t] sorted 8-byte blake2b hashes of the terms
+    offsets.npy    int64[t + 1], postings of term i are [off[i]:off[i + 1]]
+    rows.npy       int32[p] chunk-store rows, ascending within a term
+    tfs.npy        uint16[p] term frequency of the term in that row
+    lengths.npy    int32[n] tokens per row (0 for deleted rows)
+    meta.json      BM25 parameters, number of documents, average length
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from Chunk_store import ChunkStore
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+# very common words carry no signal and make up most postings
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the
+their there this to was were which will with you your can also not
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def build_sparse_index(store_dir: str, sparse_dir: str, block_size: int = 20000) -> None:
+    """Index every live row of the chunk store in `store_dir` into `sparse_dir`."""
+    store = ChunkStore(store_dir)
+    lengths = np.zeros(len(store), dtype=np.int32)
+    hashes: Dict[str, int] = {}
+    term_parts, row_parts, tf_parts = [], [], []
+
+    live_rows = store.live_rows()
+    for start in range(0, len(live_rows), block_size):
+        terms, rows, tfs = [], [], []
+        for row in live_rows[start:start + block_size].tolist():
+            counts = Counter(tokenize(store.text(row)))
+            lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                if term not in hashes:
+                    hashes[term] = term_hash(term)
+                terms.append(hashes[term])
+                rows.append(row)
+                tfs.append(min(tf, 65535))
+        term_parts.append(np.array(terms, dtype=np.uint64))
+        row_parts.append(np.array(rows, dtype=np.int32))
+        tf_parts.append(np.array(tfs, dtype=np.uint16))
+
+    terms = np.concatenate(term_parts) if term_parts else np.empty(0, np.uint64)
+    # stable sort keeps rows ascending inside each term's postings
+    order = np.argsort(terms, kind="stable")
+    unique_terms, counts = np.unique(terms[order], return_counts=True)
+    offsets = np.zeros(len(unique_terms) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    tmp_dir = sparse_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "terms.npy"), unique_terms)
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "rows.npy"), np.concatenate(row_parts)[order] if row_parts else np.empty(0, np.int32))
+    np.save(os.path.join(tmp_dir, "tfs.npy"), np.concatenate(tf_parts)[order] if tf_parts else np.empty(0, np.uint16))
+    np.save(os.path.join(tmp_dir, "lengths.npy"), lengths)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({
+            "k1": BM25_K1,
+            "b": BM25_B,
+            "documents": int(len(live_rows)),
+            "average_length": float(lengths.sum() / max(len(live_rows), 1)),
+        }, f)
+
+    if os.path.exists(sparse_dir):
+        shutil.rmtree(sparse_dir)
+    os.replace(tmp_dir, sparse_dir)
+    print(f"Sparse index: {len(unique_terms)} terms, {len(terms)} postings over {len(live_rows)} chunks")
+
+
+class SparseIndex:
+    """Read-only BM25 index; `search` returns chunk-store rows and scores."""
+
+    def __init__(self, sparse_dir: str):
+        self.sparse_dir = sparse_dir
+        load = lambda name: np.load(os.path.join(sparse_dir, name), mmap_mode="r")
+        self.terms = load("terms.npy")
+        self.offsets = load("offsets.npy")
+        self.rows = load("rows.npy")
+        self.tfs = load("tfs.npy")
+        self.lengths = load("lengths.npy")
+        with open(os.path.join(sparse_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.documents = meta["documents"]
+        self.average_length = meta["average_length"] or 1.0
+
+    @staticmethod
+    def exists(sparse_dir: str) -> bool:
+        return os.path.exists(os.path.join(sparse_dir, "meta.json"))
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        key = np.uint64(term_hash(term))
+        position = int(np.searchsorted(self.terms, key))
+        if position == len(self.terms) or self.terms[position] != key:
+            return None, None
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.rows[start:end], self.tfs[start:end]
+
+    def search(self, query: str, k: int, allowed_rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top `k` rows by BM25, optionally only among `allowed_rows`."""
+        matched_rows, matched_scores = [], []
+        for term in set(tokenize(query)):
+            rows, tfs = self.postings(term)
+            if rows is None:
+                continue
+            df = len(rows)
+            if allowed_rows is not None:
+                # idf stays corpus-wide; only the candidates are restricted
+                keep = np.isin(rows, allowed_rows, assume_unique=True)
+                rows, tfs = rows[keep], tfs[keep]
+            idf = math.log(1 + (self.documents - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[rows] / self.average_length)
+            matched_rows.append(rows)
+            matched_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        if not matched_rows:
+            return np.empty(0, np.int64), np.empty(0, np.float32)
+        rows, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+        top = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top].astype(np.int64), scores[top]
@@ -0,0 +1,195 @@
+"""
+Shared cache of flight and hotel search results.
+
+search_flights and search_hotels call SerpAPI on every invocation, although
+travellers (and the LLM, within one conversation) ask for the same route,
+city and dates again and again. Results are cached per tool, keyed by the
+normalized tool arguments ("COK" and " cok " share an entry):
+
+    memory     LRU of TOOL_CACHE_SIZE entries, shared by all sessions of
+               the process
+    disk       optional SQLite file (TOOL_CACHE_DB), shared by processes
+               and kept across restarts
+
+A result is fresh for the tool's TTL (TOOL_CACHE_TTL). For the tool's stale
+window (TOOL_CACHE_STALE) after that it is still returned at once while a
+background call refreshes it (stale-while-revalidate); older entries are
+fetched again. Fares move within minutes, so flights get a short window.
+Errors and other uncacheable results are never stored, so a failed call is
+retried on the next question.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# entries kept in memory; 0 disables the cache
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "512"))
+# seconds a result is fresh; tools without a TTL are never cached
+TOOL_CACHE_TTL = {
+    "search_flights": float(os.getenv("FLIGHT_CACHE_TTL", "900")),  # fares move quickly
+    "search_hotels": float(os.getenv("HOTEL_CACHE_TTL", "3600")),
+}
+# seconds past the TTL during which the stale result is served while it is refreshed
+TOOL_CACHE_STALE = {
+    "search_flights": float(os.getenv("FLIGHT_CACHE_STALE", "300")),
+    "search_hotels": float(os.getenv("HOTEL_CACHE_STALE", "3600")),
+}
+# SQLite file of the disk tier; empty string keeps the cache in memory only
+TOOL_CACHE_DB = os.getenv("TOOL_CACHE_DB", "")
+# background refreshes running at once
+REFRESH_WORKERS = 2
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def normalize_args(args: Dict[str, Any]) -> str:
+    return json.dumps(_normalize(args), sort_keys=True, separators=(",", ":"))
+
+
+def cacheable(result: Any) -> bool:
+    # tools report failures in the result instead of raising
+    return isinstance(result, dict) and "error" not in result and result.get("success", True) is not False
+
+
+class ToolCache:
+    """In-memory LRU over an optional SQLite tier, with stale-while-revalidate."""
+
+    def __init__(self, max_entries: int = TOOL_CACHE_SIZE, ttls: Optional[Dict[str, float]] = None,
+                 stale: Optional[Dict[str, float]] = None, db_path: str = TOOL_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttls = dict(TOOL_CACHE_TTL if ttls is None else ttls)
+        self.stale = dict(TOOL_CACHE_STALE if stale is None else stale)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[dict, float]]" = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self.counters = {"hits": 0, "stale_hits": 0, "disk_hits": 0, "misses": 0,
+                         "refreshes": 0, "refresh_errors": 0, "evictions": 0}
+
+        self._db = None
+        if db_path and max_entries > 0:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")  # readers in other processes don't block writes
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tool_results ("
+                "tool TEXT NOT NULL, key TEXT NOT NULL, result TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (tool, key))"
+            )
+            # drop what can no longer be served, even stale
+            oldest = time.time() - max((ttl + self.stale.get(tool, 0.0) for tool, ttl in self.ttls.items()),
+                                       default=0.0)
+            self._db.execute("DELETE FROM tool_results WHERE created < ?", (oldest,))
+            self._db.commit()
+
+    def _get(self, tool: str, key: str) -> Optional[Tuple[dict, float]]:
+        with self._lock:
+            entry = self._entries.get((tool, key))
+            if entry is not None:
+                self._entries.move_to_end((tool, key))
+                return entry
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT result, created FROM tool_results WHERE tool = ? AND key = ?",
+                                   (tool, key)).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1])
+        self._put(tool, key, entry, persist=False)
+        with self._lock:
+            self.counters["disk_hits"] += 1
+        return entry
+
+    def _put(self, tool: str, key: str, entry: Tuple[dict, float], persist: bool = True) -> None:
+        with self._lock:
+            self._entries[(tool, key)] = entry
+            self._entries.move_to_end((tool, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # least recently used
+                self.counters["evictions"] += 1
+            if persist and self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO tool_results VALUES (?, ?, ?, ?)",
+                                 (tool, key, json.dumps(entry[0]), entry[1]))
+                self._db.commit()
+
+    def _fetch(self, tool: str, key: str, func: Callable[..., Any], kwargs: Dict[str, Any]) -> Any:
+        result = func(**kwargs)
+        if cacheable(result):
+            self._put(tool, key, (result, time.time()))
+        return result
+
+    def _revalidate(self, tool: str, key: str, func: Callable[..., Any], kwargs: Dict[str, Any]) -> None:
+        try:
+            self._fetch(tool, key, func, kwargs)
+            with self._lock:
+                self.counters["refreshes"] += 1
+        except Exception as e:
+            # the stale entry stays until it ages out
+            print(f"[TOOL CACHE] refreshing {tool} failed: {type(e).__name__}: {e}")
+            with self._lock:
+                self.counters["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard((tool, key))
+
+    def _refresh(self, tool: str, key: str, func: Callable[..., Any], kwargs: Dict[str, Any]) -> None:
+        with self._lock:
+            if (tool, key) in self._refreshing:
+                return  # one refresh per entry at a time
+            self._refreshing.add((tool, key))
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="tool-cache")
+        self._executor.submit(self._revalidate, tool, key, func, kwargs)
+
+    def call(self, tool: str, func: Callable[..., Any], **kwargs) -> Any:
+        """`func(**kwargs)`, answered from the cache when an entry of `tool` is fresh or stale."""
+        ttl = self.ttls.get(tool)
+        if self.max_entries <= 0 or ttl is None:
+            return func(**kwargs)
+        key = normalize_args(kwargs)
+        entry = self._get(tool, key)
+        if entry is not None:
+            result, created = entry
+            age = time.time() - created
+            if age <= ttl:
+                with self._lock:
+                    self.counters["hits"] += 1
+                print(f"[TOOL CACHE] {tool} hit ({age:.0f} s old)")
+                return result
+            if age <= ttl + self.stale.get(tool, 0.0):
+                with self._lock:
+                    self.counters["stale_hits"] += 1
+                print(f"[TOOL CACHE] {tool} stale hit ({age:.0f} s old), refreshing")
+                self._refresh(tool, key, func, kwargs)
+                return result
+        with self._lock:
+            self.counters["misses"] += 1
+        return self._fetch(tool, key, func, kwargs)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM tool_results")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,284 @@
+"""
+index_eval.py
+=============
+Recall@k vs latency report for the approximate FAISS index types.
+
+Steps:
+  1. Load the flat (exact) index built by Faiss_indexing and reconstruct its vectors
+  2. Build queries from logged questions plus a random sample of corpus vectors
+  3. Compute exact top-k neighbours with the flat index (ground truth)
+  4. For each index type (IVF-Flat, IVF-PQ, HNSW, SQ8), train, add all vectors and
+     sweep nprobe / efSearch, measuring recall@k, per-query latency and index size
+  5. Save a JSON report + print a summary table
+
+With --chunking it instead compares the recursive splitter with the
+section-aware chunker on a sample of articles: chunks, stored text and
+vector size, chunk + embed time, and known-item recall (a sentence taken
+from an article should retrieve a chunk containing it, or at least a chunk
+of the same article).
+
+Usage:
+    python index_eval.py
+    python index_eval.py --k 10 --queries 1000 --output index_report.json
+    python index_eval.py --chunking --articles 500 --k 5
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import faiss
+import numpy as np
+from Data_loading import CHUNK_OVERLAP, CHUNK_SIZE, create_chunks, iter_json_articles
+from Embedding_backend import create_embeddings
+from Faiss_indexing import DATA_DIR, INDEX_DIR, TRAIN_SIZE, configure_search, make_index
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+PROJECT_ROOT = Path(__file__).parent.parent
+LOG_FILE = PROJECT_ROOT / "qa_context_log.json"
+PREPARED_DATASET_FILE = PROJECT_ROOT / "prepared_eval_dataset.json"
+DEFAULT_REPORT_FILE = PROJECT_ROOT / "index_eval_report.json"
+DEFAULT_CHUNKING_REPORT_FILE = PROJECT_ROOT / "chunking_eval_report.json"
+
+# (strategy, chunk_size, chunk_overlap) compared by --chunking; the first is the old splitter
+CHUNKING_CONFIGS = [
+    ("recursive", 1000, 200),
+    ("section", CHUNK_SIZE, CHUNK_OVERLAP),
+]
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Search knob values swept for each index type
+SWEEPS = {
+    "ivf_flat": ("nprobe", [1, 4, 16, 64]),
+    "ivf_pq": ("nprobe", [1, 4, 16, 64]),
+    "hnsw": ("efSearch", [16, 32, 64, 128]),
+    "sq8": (None, [None]),
+}
+
+
+# ---------------------------------------------------------------------------
+# Helper utilities
+# ---------------------------------------------------------------------------
+def load_logged_questions() -> List[str]:
+    """Collect questions from the QA log and the prepared eval dataset."""
+    questions = []
+    for path in (LOG_FILE, PREPARED_DATASET_FILE):
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                questions.extend(e["question"] for e in json.load(f) if e.get("question"))
+    return list(dict.fromkeys(q.strip() for q in questions if q.strip()))
+
+
+def load_flat_vectors(index_dir: str = INDEX_DIR) -> np.ndarray:
+    """Reconstruct every stored vector from the exact flat index."""
+    index = faiss.read_index(str(Path(index_dir) / "index.faiss"))
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)  # ids are chunk rows; only vectors matter here
+    if not isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+        raise ValueError(
+            f"{index_dir} does not hold a flat index; rebuild it with FAISS_INDEX_TYPE=flat"
+        )
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def index_size_mb(index) -> float:
+    return faiss.serialize_index(index).nbytes / (1024 * 1024)
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict[str, float]:
+    """Search one query at a time (as the API does) and compare with the exact top-k."""
+    latencies = []
+    hits = 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0]) & set(truth[i]))
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "mean_latency_ms": float(latencies_ms.mean()),
+        "p95_latency_ms": float(np.percentile(latencies_ms, 95)),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Main pipeline
+# ---------------------------------------------------------------------------
+def run_eval(k: int = 10, num_queries: int = 500, output: str = None, seed: int = 0) -> Dict[str, Any]:
+    faiss.omp_set_num_threads(1)  # single-query latency, like a serving worker
+
+    print("📦 Loading flat index...")
+    vectors = load_flat_vectors()
+    print(f"✓ {len(vectors)} vectors of dimension {vectors.shape[1]}")
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    queries = [vectors[sample]]
+
+    questions = load_logged_questions()
+    if questions:
+        embeddings = create_embeddings()
+        queries.append(np.asarray(embeddings.embed_documents(questions), dtype="float32"))
+    queries = np.ascontiguousarray(np.vstack(queries), dtype="float32")
+    print(f"✓ {len(queries)} queries ({len(questions)} logged questions)")
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, k)
+
+    results: List[Dict[str, Any]] = [{
+        "index_type": "flat",
+        "param": None,
+        "value": None,
+        "size_mb": index_size_mb(flat),
+        "build_s": 0.0,
+        **measure(flat, queries, truth, k),
+    }]
+
+    training = vectors[rng.choice(len(vectors), size=min(TRAIN_SIZE, len(vectors)), replace=False)]
+    for index_type, (param, values) in SWEEPS.items():
+        print(f"🔧 Building {index_type}...")
+        start = time.perf_counter()
+        index = make_index(index_type, training)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        size_mb = index_size_mb(index)
+
+        for value in values:
+            if param == "nprobe":
+                configure_search(index, nprobe=value)
+            elif param == "efSearch":
+                configure_search(index, ef_search=value)
+            results.append({
+                "index_type": index_type,
+                "param": param,
+                "value": value,
+                "size_mb": size_mb,
+                "build_s": build_s,
+                **measure(index, queries, truth, k),
+            })
+
+    print("\n" + "=" * 78)
+    print(f"📈 RECALL@{k} VS LATENCY")
+    print("=" * 78)
+    print(f"{'index':<10}{'knob':<16}{'recall':>10}{'mean ms':>10}{'p95 ms':>10}{'size MB':>11}{'build s':>11}")
+    for r in results:
+        knob = f"{r['param']}={r['value']}" if r["param"] else "-"
+        print(f"{r['index_type']:<10}{knob:<16}{r['recall_at_k']:>10.4f}{r['mean_latency_ms']:>10.3f}"
+              f"{r['p95_latency_ms']:>10.3f}{r['size_mb']:>11.1f}{r['build_s']:>11.1f}")
+
+    report = {"k": k, "num_vectors": int(len(vectors)), "num_queries": int(len(queries)), "results": results}
+    output_path = output or str(DEFAULT_REPORT_FILE)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Report saved to {output_path}")
+    return report
+
+
+def sample_sentences(documents, num_queries: int, rng) -> List[Dict[str, str]]:
+    """Known-item queries: one sentence from a random section of a random article."""
+    candidates = []
+    for document in documents:
+        for sentence in SENTENCE_RE.split(document.page_content.strip()):
+            sentence = sentence.strip()
+            if 60 <= len(sentence) <= 300 and "\n" not in sentence:
+                candidates.append({"query": sentence, "id": document.metadata["id"],
+                                   "section": document.metadata["section"]})
+    chosen = rng.choice(len(candidates), size=min(num_queries, len(candidates)), replace=False)
+    return [candidates[i] for i in chosen]
+
+
+def run_chunking_eval(data_dir: str = DATA_DIR, num_articles: int = 500, k: int = 5,
+                      num_queries: int = 300, output: str = None, seed: int = 0) -> Dict[str, Any]:
+    faiss.omp_set_num_threads(1)
+    articles = list(islice(iter_json_articles(data_dir), num_articles))
+    documents = [section for sections in articles for section in sections]
+    if not articles:
+        raise SystemExit(f"No documents found in {data_dir}")
+    embeddings = create_embeddings()  # uncached, so build times are real
+    samples = sample_sentences(documents, num_queries, np.random.default_rng(seed))
+    queries = np.asarray(embeddings.embed_documents([s["query"] for s in samples]), dtype="float32")
+    print(f"✓ {len(articles)} articles, {len(samples)} known-item queries")
+
+    results: List[Dict[str, Any]] = []
+    for strategy, chunk_size, chunk_overlap in CHUNKING_CONFIGS:
+        print(f"🔧 Chunking with {strategy} ({chunk_size}/{chunk_overlap})...")
+        start = time.perf_counter()
+        chunks = create_chunks(documents, strategy, chunk_size, chunk_overlap)
+        chunk_s = time.perf_counter() - start
+        vectors = np.asarray(embeddings.embed_documents([c.page_content for c in chunks]), dtype="float32")
+        build_s = time.perf_counter() - start
+
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        _, found = index.search(queries, k)
+        passage_hits = article_hits = section_hits = 0
+        for sample, rows in zip(samples, found):
+            top = [chunks[i] for i in rows if i != -1]
+            passage_hits += any(sample["query"] in c.page_content for c in top)
+            article_hits += any(c.metadata["id"] == sample["id"] for c in top)
+            section_hits += bool(top) and top[0].metadata["id"] == sample["id"] \
+                and top[0].metadata.get("section") == sample["section"]
+        text_mb = sum(len(c.page_content.encode("utf-8")) for c in chunks) / (1024 * 1024)
+        results.append({
+            "strategy": strategy,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "chunks": len(chunks),
+            "text_mb": text_mb,
+            "vectors_mb": vectors.nbytes / (1024 * 1024),
+            "chunk_s": chunk_s,
+            "build_s": build_s,
+            "passage_recall_at_k": passage_hits / len(samples),
+            "article_recall_at_k": article_hits / len(samples),
+            # only the section chunker records sections, so this is 0 for the recursive splitter
+            "top1_section_accuracy": section_hits / len(samples),
+        })
+
+    print("\n" + "=" * 90)
+    print(f"📈 CHUNKING: SIZE, BUILD TIME AND RECALL@{k}")
+    print("=" * 90)
+    print(f"{'strategy':<22}{'chunks':>8}{'text MB':>9}{'vec MB':>9}{'build s':>9}"
+          f"{'passage':>10}{'article':>10}{'section@1':>11}")
+    for r in results:
+        name = f"{r['strategy']} {r['chunk_size']}/{r['chunk_overlap']}"
+        print(f"{name:<22}{r['chunks']:>8}{r['text_mb']:>9.2f}{r['vectors_mb']:>9.2f}{r['build_s']:>9.1f}"
+              f"{r['passage_recall_at_k']:>10.4f}{r['article_recall_at_k']:>10.4f}{r['top1_section_accuracy']:>11.4f}")
+
+    report = {"k": k, "articles": len(articles), "num_queries": len(samples), "results": results}
+    output_path = output or str(DEFAULT_CHUNKING_REPORT_FILE)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Report saved to {output_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency for FAISS index types")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--queries", type=int, default=500, help="Corpus vectors sampled as queries")
+    parser.add_argument("--output", default=None, help="Path for the JSON report")
+    parser.add_argument("--chunking", action="store_true",
+                        help="Compare the recursive splitter with section-aware chunking instead")
+    parser.add_argument("--articles", type=int, default=500, help="With --chunking, articles sampled")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="With --chunking, sectioned JSONL directory")
+    args = parser.parse_args()
+    if args.chunking:
+        run_chunking_eval(args.data_dir, num_articles=args.articles, k=args.k,
+                          num_queries=args.queries, output=args.output)
+    else:
+        run_eval(k=args.k, num_queries=args.queries, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
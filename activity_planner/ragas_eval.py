@@ -22,7 +22,9 @@ from ragas.embeddings import LangchainEmbeddingsWrapper
 from ragas.dataset_schema import SingleTurnSample, EvaluationDataset
 
 from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
+
+from Embedding_backend import create_embeddings
+from Embedding_cache import cached_embeddings
 
 load_dotenv()
 
@@ -62,11 +64,10 @@ class RagasEvaluator:
             openai_api_key=os.environ.get("OPEN_API_KEY"),
             model_name="qwen/qwen3-32b",
         )
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        embeddings = create_embeddings()
         self.ragas_llm = LangchainLLMWrapper(llm)
-        self.ragas_embeddings = LangchainEmbeddingsWrapper(embeddings)
+        # questions, answers and contexts repeat across eval runs
+        self.ragas_embeddings = LangchainEmbeddingsWrapper(cached_embeddings(embeddings))
 
     def prepare_dataset(self, test_cases: List[Dict[str, Any]]) -> EvaluationDataset:
         """
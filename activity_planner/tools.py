@@ -6,14 +6,11 @@ from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from serpapi import GoogleSearch
 import datetime
-import asyncio
-from MCP_Client import call_mcp_tool
+from MCP_Client import mcp_pool
+from Tool_cache import ToolCache
 import os
 from pprint import pprint
-import nest_asyncio
 
-# Apply the patch once at the start of your script
-nest_asyncio.apply()
 @tool
 def get_current_date() -> str:
     """Get the current local date and time."""
@@ -41,10 +38,20 @@ def get_location_by_ip() -> Dict[str, Any]:
 
 load_dotenv()
 
+# seconds a SerpAPI request may take (the client's default is effectively unbounded);
+# below Agents.TOOL_TIMEOUT so a timed-out call also frees its thread
+SERPAPI_TIMEOUT = float(os.getenv("SERPAPI_TIMEOUT", "20"))
+
+# flight and hotel results shared by all sessions
+tool_cache = ToolCache()
+
 @tool
 def search_flights(start: str, end: str, date: str) -> Dict[str, Any]:
     """Search available flights between two airports."""
+    return tool_cache.call("search_flights", fetch_flights, start=start, end=end, date=date)
+
 
+def fetch_flights(start: str, end: str, date: str) -> Dict[str, Any]:
     params = {
         "engine": "google_flights",
         "departure_id": start,
@@ -56,7 +63,11 @@ def search_flights(start: str, end: str, date: str) -> Dict[str, Any]:
     }
 
     search = GoogleSearch(params)
+    search.timeout = SERPAPI_TIMEOUT  # GoogleSearch doesn't take it as an argument
     results = search.get_dict()
+    if "error" in results:
+        # SerpAPI reports failures (bad key, quota, invalid airport) in the body
+        return {"success": False, "error": results["error"]}
 
     best_flights = results.get("best_flights", [])
 
@@ -86,33 +97,32 @@ def search_flights(start: str, end: str, date: str) -> Dict[str, Any]:
 @tool
 def search_hotels(location: str, check_in: str, check_out: str) -> str:
     """Search hotels using Google Hotels engine. Returns top 5 hotels with essential information."""
+    return tool_cache.call("search_hotels", fetch_hotels, location=location, check_in=check_in,
+                           check_out=check_out)
 
-    async def run():
-        params = {
-            "engine": "google_hotels",
-            "q": location,
-            "check_in_date": check_in,
-            "check_out_date": check_out,
-            "currency": "INR"
-        }
 
-        return await call_mcp_tool("search", {
-            "params": params,
-            "mode": "compact"
-        })
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        raw_results = loop.run_until_complete(run())
-    finally:
-        loop.close()
+def fetch_hotels(location: str, check_in: str, check_out: str) -> Dict[str, Any]:
+    params = {
+        "engine": "google_hotels",
+        "q": location,
+        "check_in_date": check_in,
+        "check_out_date": check_out,
+        "currency": "INR"
+    }
+
+    # pooled session on the MCP client's own event loop
+    raw_results = mcp_pool.call_tool("search", {
+        "params": params,
+        "mode": "compact"
+    })
     
     # MCP returns a list of text strings containing JSON
     # Parse the first item which contains the actual JSON data
     if raw_results and isinstance(raw_results, list):
         print("Raw MCP Results:", raw_results)  # Debug print
         data = json.loads(raw_results[0].text)
+        if "error" in data:
+            return {"success": False, "error": data["error"]}
         hotels_list = data.get("properties", [])
     else:
         return json.dumps({"hotels": [], "error": "No results found"})
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# the scripts import their siblings by module name, as when run from their directory
+ROOT = Path(__file__).resolve().parent.parent
+for directory in ("Data_preparation", "activity_planner"):
+    sys.path.insert(0, str(ROOT / directory))
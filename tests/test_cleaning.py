@@ -0,0 +1,42 @@
+"""The compiled cleaning pipeline must produce exactly the legacy output."""
+
+import random
+
+import pytest
+
+from benchmark_cleaning import SAMPLE_ARTICLE, legacy_clean_with_regex
+from prepare_wikivoyage_data import clean_with_regex
+
+ADVERSARIAL = [
+    "* == Header ==\nbody",          # list marker in front of a header
+    "[[a [[b]] c",                   # link nested in an unclosed link
+    "{{a {b} c}} d",                 # single braces inside a template
+    "{{{a}}}",
+    "}}{{x}}{{",
+    "[[Image:x [[File:y]] z]]",      # file link nested in an image link
+    "<!-- <coordinates> -->1</coordinates>",
+    "48°<!-- -->N 2° E",
+    "<<b>ref>x</ref>",               # a tag joined by removing another one
+    "{{" * 12 + "deep" + "}}" * 12,  # deeper than the template rounds
+    "[[Category:A\n]] [[Category:B]]",
+    "[http://example.org label] https://example.org/x",
+]
+
+TOKENS = [
+    "{{", "}}", "{", "}", "[[", "]]", "[", "]", "|", "{|", "|}", "File:", "Image:", "Category:", "coord|",
+    "<", ">", "<!--", "-->", "<ref>", "</ref>", "<ref/>", "<gallery>", "</gallery>", "<coordinates>",
+    "</coordinates>", "<b>", "ref", "''", "'''", "\n", "\n\n\n", "* ", "# ", ": ", "==", "= ", " ", "\t",
+    "a", "word", "48", ".", "°", "N", "E", "12.5", "http://x.org", "[http://z.org label]", "'",
+]
+
+
+@pytest.mark.parametrize("text", ADVERSARIAL + [SAMPLE_ARTICLE])
+def test_matches_legacy_on_adversarial_markup(text):
+    assert clean_with_regex(text) == legacy_clean_with_regex(text)
+
+
+def test_matches_legacy_on_random_markup():
+    rng = random.Random(0)
+    for _ in range(20000):
+        text = "".join(rng.choice(TOKENS) for _ in range(rng.randint(1, 25)))
+        assert clean_with_regex(text) == legacy_clean_with_regex(text), repr(text)
@@ -0,0 +1,66 @@
+"""Section documents come from the record fields, not from re-parsing the joined text."""
+
+import json
+
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_text_splitters")
+
+from Data_loading import article_text, create_chunks, iter_json_articles, process_json_files
+
+ARTICLES = [
+    {"id": "1", "title": "Rome", "intro": "Rome is the capital of Italy.",
+     # a body line that looks like a heading must stay in its section
+     "see": "The Colosseum.\n\nEAT:\nis painted on the old bakery sign.",
+     "sleep": "Hotels near Termini."},
+    {"id": "2", "title": "Empty"},
+    {"id": "3", "title": "Oslo", "do": "Ski in winter.", "drink": "   "},
+]
+
+
+@pytest.fixture()
+def data_dir(tmp_path):
+    (tmp_path / "AA").mkdir()
+    with open(tmp_path / "AA" / "wiki_00", "w") as f:
+        for article in ARTICLES:
+            f.write(json.dumps(article) + "\n")
+    return str(tmp_path)
+
+
+def test_one_document_per_section(data_dir):
+    articles = list(iter_json_articles(data_dir))
+    assert [[s.metadata["section"] for s in sections] for sections in articles] == \
+        [["intro", "see", "sleep"], ["do", "drink"]]
+    rome = articles[0]
+    assert rome[1].page_content == ARTICLES[0]["see"]
+    assert {s.metadata["title"] for s in rome} == {"Rome"}
+    assert [s.metadata["seq_num"] for s in articles[1]] == [3, 3]
+    assert len(process_json_files(data_dir)) == 5
+
+
+def test_section_chunks_keep_their_section(data_dir):
+    chunks = create_chunks(next(iter_json_articles(data_dir)), "section")
+    assert [c.metadata["section"] for c in chunks] == ["intro", "see", "sleep"]
+    assert chunks[1].page_content == "SEE:\n" + ARTICLES[0]["see"]
+    assert all("EAT" not in c.page_content for c in chunks if c.metadata["section"] != "see")
+
+
+def test_recursive_chunking_splits_the_joined_article(data_dir):
+    articles = list(iter_json_articles(data_dir))
+    assert article_text(articles[0]) == (
+        "INTRO:\nRome is the capital of Italy.\n\nSEE:\n" + ARTICLES[0]["see"] + "\n\nSLEEP:\nHotels near Termini.")
+    chunks = create_chunks([s for sections in articles for s in sections], "recursive")
+    assert [c.metadata["title"] for c in chunks] == ["Rome", "Oslo"]
+    assert all("section" not in c.metadata for c in chunks)
+
+
+def test_parallel_parsing_keeps_file_order(tmp_path):
+    for part in range(5):
+        (tmp_path / f"A{part}").mkdir()
+        with open(tmp_path / f"A{part}" / "wiki_00", "w") as f:
+            for i in range(3):
+                f.write(json.dumps({"id": f"{part}-{i}", "title": f"T{part}-{i}", "intro": "Text."}) + "\n")
+    sequential = [s[0].metadata["id"] for s in iter_json_articles(str(tmp_path))]
+    parallel = [s[0].metadata["id"] for s in iter_json_articles(str(tmp_path), workers=2)]
+    assert parallel == sequential and len(sequential) == 15
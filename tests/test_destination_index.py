@@ -0,0 +1,50 @@
+"""Destination detection: capitalization, topic articles and marginal fuzzy matches."""
+
+import json
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from Destination_index import DestinationIndex, is_destination_title, normalize_name, title_aliases
+
+TITLES = ["Nice", "Bath", "Barcelona", "Rio de Janeiro", "New York City", "Paris", "Paris (Texas)",
+          "Isle of Man", "Air travel", "Driving in Germany", "Granada", "Grenada", "Kyoto"]
+
+
+@pytest.fixture()
+def index(tmp_path):
+    names = {normalize_name(title): title for title in TITLES}
+    for title in TITLES:
+        for alias in title_aliases(title):
+            names.setdefault(alias, title)
+    names["nyc"] = names["new york"] = "New York City"
+    path = tmp_path / "destinations.json"
+    path.write_text(json.dumps({"titles": {title: [[i, i + 1]] for i, title in enumerate(TITLES)},
+                                "names": names}))
+    return DestinationIndex(str(path))
+
+
+def test_topic_titles_are_not_destinations():
+    assert is_destination_title("Rio de Janeiro")
+    assert is_destination_title("Isle of Man")
+    assert is_destination_title("Paris (Texas)")
+    assert not is_destination_title("Air travel")
+    assert not is_destination_title("Driving in Germany")
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Things to do in Nice", ["Nice"]),
+    ("Where to stay in Rio de Janeiro?", ["Rio de Janeiro"]),
+    ("best hotels in barcelona", ["Barcelona"]),
+    ("what to see in nyc", ["New York City"]),
+    ("Weekend in Kyoto and Paris", ["Kyoto", "Paris"]),
+    ("I had a nice bath", []),  # lowercase common words
+    ("what is nice to eat", []),
+    ("Tips for air travel with kids", []),  # topic article
+    ("Is driving in germany hard?", []),
+    ("Cheap flights to Barcelonna", ["Barcelona"]),  # misspelling
+    ("Beaches of Grnada", []),  # as close to Grenada as to Granada
+])
+def test_detect(index, query, expected):
+    assert index.detect(query) == expected
@@ -0,0 +1,78 @@
+"""The embedding cache folds new keys into its sorted arrays and still finds every row."""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+
+import Embedding_cache
+from Embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings:
+    model_name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 997)] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_new_rows_are_merged_and_found(tmp_path, monkeypatch):
+    monkeypatch.setattr(Embedding_cache, "MERGE_EVERY", 8)
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, cache_dir=str(tmp_path))
+    texts = [f"chunk {i}" for i in range(100)]
+    expected = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    model.calls = 0
+
+    for start in range(0, len(texts), 5):
+        cache.embed_documents(texts[start:start + 5])
+    assert len(cache._new_rows) < 8  # merged along the way, not kept per chunk
+    assert np.all(cache._sorted_keys[1:] > cache._sorted_keys[:-1])
+
+    assert np.array_equal(np.asarray(cache.embed_documents(texts), dtype=np.float32), expected)
+    assert model.calls == len(texts)  # every text was embedded exactly once
+
+    reopened = CachedEmbeddings(CountingEmbeddings(), model_name="counting", cache_dir=str(tmp_path))
+    assert np.array_equal(np.asarray(reopened.embed_documents(texts), dtype=np.float32), expected)
+    assert reopened.misses == 0
+
+
+class SlowEmbeddings(CountingEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.1)
+        with self.lock:
+            self.active -= 1
+        return super().embed_documents(texts)
+
+
+def test_model_calls_run_outside_the_lock(tmp_path):
+    model = SlowEmbeddings()
+    cache = CachedEmbeddings(model, cache_dir=str(tmp_path))
+    batches = [[f"text {i}", "shared"] for i in range(4)]
+    threads = [threading.Thread(target=cache.embed_documents, args=(batch,)) for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert model.max_active > 1
+    assert cache.rows == 5  # "shared" is stored once although several callers embedded it
+    assert cache.embed_documents(["shared"]) == model.embed_documents(["shared"])
@@ -0,0 +1,27 @@
+"""ONNX and int8 embeddings stay within PARITY_TOLERANCE of the PyTorch ones."""
+
+import pytest
+
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain_huggingface")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("optimum")
+
+from Embedding_backend import PARITY_SAMPLE_TEXTS, PARITY_TOLERANCE, check_parity, create_embeddings
+
+
+@pytest.fixture(scope="module")
+def model_available():
+    try:
+        create_embeddings("torch")
+    except OSError as e:
+        # not cached locally and no network to download it
+        pytest.skip(f"embedding model unavailable: {e}")
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx_int8"])
+def test_backend_matches_torch(model_available, backend):
+    report = check_parity(backend, PARITY_SAMPLE_TEXTS)
+    assert report["min_cosine"] >= PARITY_TOLERANCE[backend], report
+    assert report["passed"]
@@ -0,0 +1,50 @@
+"""Keyword tier of the intent classifier: strong words decide, weak ones defer."""
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from Intent_classifier import INTENT_CONFIDENCE, KEYWORD_CONFIDENCE, IntentClassifier
+
+
+class StubClassifier(IntentClassifier):
+    """Embedding tier replaced by a fixed answer."""
+
+    def __init__(self, label, confidence):
+        super().__init__(embeddings=None, use_llm=False)
+        self.answer = (label, confidence)
+
+    def embedding(self, query, vector=None):
+        return self.answer
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("hi", "non_trip"),
+    ("thank you!", "non_trip"),
+    ("plan a trip to boston", "trip"),
+    ("look for flght and hotels for mid of next month from my place", "trip"),
+    ("Recommend an itinerary for Japan", "trip"),
+    # weak words alone don't decide
+    ("How many days in a leap year?", None),
+    ("When should I visit a doctor?", None),
+    ("What size is a passport photo?", None),
+    ("airport", None),
+])
+def test_keyword(query, expected):
+    assert StubClassifier("non_trip", 0.9).keyword(query) == expected
+
+
+def test_weak_word_against_a_non_trip_embedding_defers():
+    result = StubClassifier("non_trip", 0.99).local("Do I need a visa for Peru?")
+    assert result["tier"] == "embedding"
+    assert result["confidence"] < INTENT_CONFIDENCE  # classify() asks the LLM
+
+
+def test_weak_word_with_a_trip_embedding_is_local():
+    result = StubClassifier("trip", 0.9).local("Best time to visit Bali")
+    assert (result["question_type"], result["confidence"]) == ("trip", 0.9)
+
+
+def test_strong_word_is_keyword_decision():
+    result = StubClassifier("non_trip", 0.99).local("cheap flights to Rome")
+    assert (result["tier"], result["confidence"]) == ("keyword", KEYWORD_CONFIDENCE)
@@ -0,0 +1,56 @@
+"""Manifest handling: incremental runs, full runs and worker counts."""
+
+import json
+
+import pytest
+
+import prepare_wikivoyage_data as prep
+
+TEXT = "Sampleton is a small town on the river with an old harbour and a market. " * 3 + "\nSee\nThe harbour."
+
+
+def write_input(path, title):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"id": title, "title": title, "text": TEXT}) + "\n", encoding="utf-8")
+
+
+def test_version_change_keeps_file_list(tmp_path, monkeypatch):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    write_input(input_dir / "AA" / "wiki_00", "Sampleton")
+    write_input(input_dir / "AA" / "wiki_01", "Otherton")
+    prep.process_directory(input_dir, output_dir, incremental=True)
+    assert (output_dir / "AA" / "wiki_01").exists()
+
+    monkeypatch.setattr(prep, "PIPELINE_VERSION", prep.PIPELINE_VERSION + 1)
+    manifest = prep.load_manifest(output_dir)
+    assert set(manifest["files"]) == {"AA/wiki_00", "AA/wiki_01"}
+    assert all(entry["stale"] for entry in manifest["files"].values())
+
+    (input_dir / "AA" / "wiki_01").unlink()
+    prep.process_directory(input_dir, output_dir, incremental=True)
+
+    assert not (output_dir / "AA" / "wiki_01").exists()
+    manifest = prep.load_manifest(output_dir)
+    assert manifest["pipeline_version"] == prep.PIPELINE_VERSION
+    assert list(manifest["files"]) == ["AA/wiki_00"]
+    assert "stale" not in manifest["files"]["AA/wiki_00"]
+
+
+def test_full_run_does_not_hash_inputs(tmp_path, monkeypatch):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    write_input(input_dir / "AA" / "wiki_00", "Sampleton")
+
+    def no_hashing(path):
+        raise AssertionError(f"hashed {path}")
+
+    monkeypatch.setattr(prep, "file_sha256", no_hashing)
+    prep.process_directory(input_dir, output_dir)
+    assert (output_dir / "AA" / "wiki_00").exists()
+    assert not (output_dir / prep.MANIFEST_NAME).exists()
+
+
+def test_workers_must_be_positive(tmp_path):
+    with pytest.raises(SystemExit):
+        prep.parse_args(["in", "out", "--workers", "0"])
+    with pytest.raises(ValueError):
+        prep.process_directory(tmp_path, tmp_path / "out", workers=0)
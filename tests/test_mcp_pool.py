@@ -0,0 +1,119 @@
+"""MCP session pool against a local stub MCP server: reuse, reconnects, retries and deadlines."""
+
+import asyncio
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+# requirements.txt pins mcp<2: with 2.x installed these tests fail to import instead of skipping
+pytest.importorskip("mcp")
+pytest.importorskip("dotenv")
+
+import httpx
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED, INVALID_REQUEST, ErrorData
+
+from MCP_Client import MCPSessionPool, session_broken
+
+STUB_SERVER = """
+import asyncio, json, sys
+from mcp.server.fastmcp import FastMCP
+
+app = FastMCP("stub", port=int(sys.argv[1]), log_level="WARNING")
+
+@app.tool()
+async def search(params: dict, mode: str = "compact") -> str:
+    await asyncio.sleep(params.get("delay", 0.05))
+    return json.dumps({"properties": [{"name": "Hotel in " + params["q"]}]})
+
+app.run(transport="streamable-http")
+"""
+ARGS = {"params": {"q": "Goa"}, "mode": "compact"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubServer:
+    def __init__(self, script, port):
+        self.script = script
+        self.port = port
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, str(self.script), str(self.port)],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.2).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("stub MCP server did not start")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+@pytest.fixture()
+def server(tmp_path):
+    script = tmp_path / "mcp_stub_server.py"
+    script.write_text(STUB_SERVER)
+    server = StubServer(script, free_port())
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture()
+def pool(server):
+    pool = MCPSessionPool(url=f"http://127.0.0.1:{server.port}/mcp", size=1, timeout=5, health_interval=0)
+    yield pool
+    pool.close()
+
+
+def test_sessions_are_reused(pool):
+    for _ in range(3):
+        assert "Hotel in Goa" in pool.call_tool("search", ARGS)[0].text
+    assert "search" in [tool.name for tool in asyncio.run(pool.list_tools_async())]
+    assert pool.stats()["connects"] == 1
+
+
+def test_server_restart_is_retried_on_a_new_session(pool, server):
+    pool.call_tool("search", ARGS)
+    server.stop()
+    server.start()
+    assert "Hotel in Goa" in pool.call_tool("search", ARGS)[0].text
+    stats = pool.stats()
+    assert stats["retries"] + stats["reconnects"] >= 1
+
+
+def test_one_deadline_covers_the_wait_for_a_session(pool):
+    pool.call_tool("search", ARGS)  # connect outside the measurement
+    slow = {"params": {"q": "Goa", "delay": 1.0}, "mode": "compact"}
+    holder = threading.Thread(target=pool.call_tool, args=("search", slow))
+    holder.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    # waits ~0.9 s for the only session, leaving too little of its 1.2 s for a 1 s search
+    with pytest.raises((TimeoutError, asyncio.TimeoutError)):
+        pool.call_tool("search", slow, timeout=1.2)
+    assert time.monotonic() - start < 1.6
+    holder.join()
+
+
+def test_only_broken_sessions_are_retried():
+    assert session_broken(McpError(ErrorData(code=CONNECTION_CLOSED, message="Connection closed")))
+    assert session_broken(McpError(ErrorData(code=32600, message="Session terminated")))
+    assert session_broken(httpx.ConnectError("refused"))
+    assert not session_broken(McpError(ErrorData(code=INVALID_REQUEST, message="Invalid request")))
+    assert not session_broken(ValueError("bad arguments"))
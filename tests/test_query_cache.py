@@ -0,0 +1,78 @@
+"""Query cache levels and invalidation."""
+
+import numpy as np
+import pytest
+
+from Query_cache import QueryCache, calibrate
+
+SCOPE = (("Rome",), (), 4, 3)
+
+
+def test_semantic_level_is_off_by_default():
+    cache = QueryCache(max_entries=8)
+    cache.put("cheap hotels in Rome", np.array([1.0, 0.0]), SCOPE, "v1", {"answer": "cheap"})
+    assert cache.get("Cheap hotels in Rome?", SCOPE, "v1") == {"answer": "cheap"}
+    assert cache.get_similar(np.array([1.0, 0.01]), SCOPE, "v1") is None
+
+
+def test_semantic_level_when_enabled():
+    cache = QueryCache(max_entries=8, similarity=0.95, semantic=True)
+    cache.put("cheap hotels in Rome", np.array([1.0, 0.0]), SCOPE, "v1", {"answer": "cheap"})
+    assert cache.get_similar(np.array([1.0, 0.01]), SCOPE, "v1") == {"answer": "cheap"}
+    assert cache.get_similar(np.array([1.0, 1.0]), SCOPE, "v1") is None
+    assert cache.get_similar(np.array([1.0, 0.01]), (("Paris",), (), 4, 3), "v1") is None
+
+
+def test_new_index_version_drops_the_cache():
+    cache = QueryCache(max_entries=8)
+    cache.put("cheap hotels in Rome", np.array([1.0, 0.0]), SCOPE, "v1", {"answer": "cheap"})
+    assert cache.get("cheap hotels in Rome", SCOPE, "v2") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+class FixedEmbeddings:
+    vectors = {"a": [1.0, 0.0], "a'": [0.99, 0.1], "b": [0.9, 0.3], "c": [0.0, 1.0]}
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+
+def test_calibrate_reports_the_separating_range():
+    report = calibrate(FixedEmbeddings(), [("a", "a'", True), ("a", "b", False), ("a", "c", False)])
+    assert 0.99 < report["min_same"] < 1.0
+    assert 0.94 < report["max_different"] < 0.95
+
+
+class Store:
+    def __init__(self, vectors):
+        import faiss
+        self.index = faiss.IndexFlatIP(2)
+        self.index.add(np.asarray(vectors, dtype="float32"))
+        self.docstore = self
+        self.index_to_docstore_id = {i: i for i in range(len(vectors))}
+        self.embedding_function = self
+
+    def search(self, i):
+        from langchain_core.documents import Document
+        return Document(page_content=f"chunk {i}")
+
+    def embed_query(self, query):
+        return [1.0, 0.0]
+
+
+def test_published_update_drops_the_cache_of_a_running_engine():
+    pytest.importorskip("faiss")
+    pytest.importorskip("langchain_core")
+    from Retrieval import RetrievalEngine
+
+    published = ["v1"]
+    engine = RetrievalEngine(Store([[1.0, 0.0], [0.0, 1.0]]), cache=QueryCache(max_entries=8),
+                             index_version=lambda: published[0], k=2)
+    engine.search("things to do")
+    assert engine.search("things to do")["cached"] == "exact"
+
+    published[0] = "v2"
+    # the loaded index is superseded: nothing is served from, or added to, the cache
+    assert engine.search("things to do")["cached"] == ""
+    assert engine.search("things to do")["cached"] == ""
+    assert engine.cache.stats()["invalidations"] == 1
@@ -0,0 +1,28 @@
+"""
+Golden-file test of the section tokenizer.
+
+sections_expected.json holds the output of the original regex-split
+extract_sections_robust for every article of sections_input.jsonl (headers
+with and without dots, stray and indented headers, repeated and empty
+sections, seeded random line soups). The single-pass tokenizer must
+reproduce it exactly, including the order of the fields.
+"""
+
+import json
+from pathlib import Path
+
+from prepare_wikivoyage_data import extract_sections_robust
+
+DATA = Path(__file__).parent / "data"
+
+
+def test_tokenizer_matches_golden_output():
+    with open(DATA / "sections_expected.json", encoding="utf-8") as f:
+        expected = json.load(f)
+    with open(DATA / "sections_input.jsonl", encoding="utf-8") as f:
+        articles = [json.loads(line) for line in f]
+
+    assert len(articles) == len(expected)
+    for article in articles:
+        sections = extract_sections_robust(article["text"])
+        assert list(sections.items()) == list(expected[article["id"]].items()), article["id"]
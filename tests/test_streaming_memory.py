@@ -0,0 +1,52 @@
+"""Peak memory of process_json_file stays flat however large the shard is."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("resource")  # ru_maxrss is Unix-only
+
+DATA_PREPARATION = Path(__file__).resolve().parent.parent / "Data_preparation"
+INPUT_MB = 40
+# holding the articles in memory, as before streaming, grows peak RSS by ~50 MB here
+RSS_CEILING_MB = 16
+
+PROBE = """
+import json, resource, sys
+from pathlib import Path
+import prepare_wikivoyage_data as prep
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+kept, _, _ = prep.process_json_file(Path(sys.argv[1]), Path(sys.argv[2]), sys.argv[3] or None)
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"kept": kept, "growth_kb": after - before}))
+"""
+
+
+def write_synthetic_shard(path, size_mb):
+    body = "The old town has narrow streets, small squares and a busy market by the river. " * 40
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while f.tell() < size_mb * 2**20:
+            article = {"id": str(count), "title": f"Town {count}", "text": f"{body}\nSee\n{body}\nEat\n{body}"}
+            f.write(json.dumps(article) + "\n")
+            count += 1
+    return count
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_peak_rss_is_bounded(tmp_path, compression):
+    shard = tmp_path / "wiki_00"
+    count = write_synthetic_shard(shard, INPUT_MB)
+
+    # a fresh process, so ru_maxrss only reflects this run
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, str(shard), str(tmp_path / "out" / "wiki_00"), compression or ""],
+        cwd=DATA_PREPARATION, capture_output=True, text=True, check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert report["kept"] == count
+    assert report["growth_kb"] < RSS_CEILING_MB * 1024
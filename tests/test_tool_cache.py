@@ -0,0 +1,54 @@
+"""Tool result cache: per-tool stale windows and uncacheable error results."""
+
+import pytest
+
+import Tool_cache
+from Tool_cache import ToolCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(Tool_cache.time, "time", clock)
+    return clock
+
+
+class Counter:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        return self.result
+
+
+def test_errors_are_not_cached(clock):
+    cache = ToolCache(ttls={"search_flights": 900}, stale={"search_flights": 300})
+    fetch = Counter({"success": False, "error": "Invalid API key."})
+    for _ in range(2):
+        assert cache.call("search_flights", fetch, start="COK", end="GOI", date="2026-03-03")["success"] is False
+    assert fetch.calls == 2
+
+
+def test_each_tool_has_its_own_stale_window(clock, monkeypatch):
+    monkeypatch.setattr(ToolCache, "_refresh", lambda self, tool, key, func, kwargs: None)
+    cache = ToolCache(ttls={"search_flights": 900, "search_hotels": 3600},
+                      stale={"search_flights": 300, "search_hotels": 3600})
+    flights, hotels = Counter({"flights": [1]}), Counter({"hotels": [1]})
+    cache.call("search_flights", flights, start="COK")
+    cache.call("search_hotels", hotels, location="Goa")
+
+    clock.now += 3600 + 1  # past the flight stale window, inside the hotel one
+    cache.call("search_flights", flights, start="COK")
+    cache.call("search_hotels", hotels, location="Goa")
+    assert (flights.calls, hotels.calls) == (2, 1)
+    assert cache.stats()["stale_hits"] == 1